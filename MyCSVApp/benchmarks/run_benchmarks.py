@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import pathlib
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Benchmarks for the dashboard at several data sizes. For every row count a synthetic
+# dataset is generated (and kept under benchmarks/.data for the next run), then a fresh
+# interpreter times:
+#   - module load of app.py with an empty cache (cold) and with the cache from the cold
+#     run (warm), plus the figure cache warm-up
+#   - module load with LAZY_TABS=1 and an empty cache (lazy), plus the first request for
+#     the weather tab, which then prepares the data
+#   - each figure builder, bypassing the figure cache, after one untimed run
+#   - end-to-end callback latency through the Flask test client
+# and reports wall time and peak memory per step (peak traced allocations, or the
+# process's peak RSS for module load).
+#
+#   python benchmarks/run_benchmarks.py --rows 50000 500000 5000000 [--output results.json]
+BENCHMARKS = pathlib.Path(__file__).resolve().parent
+SRC = BENCHMARKS.parent.joinpath('src')
+
+
+def measure(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - started
+    # a second, traced run for the peak memory, so tracing doesn't skew the timing
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def callback_body(output, inputs, dataset_version, selection):
+    inputs = inputs + [('live-version', 'data', {'version': dataset_version, 'days': [], 'months': []})]
+    selection = [('store-dropdown', 'value', selection[0]), ('year-dropdown', 'value', selection[1])]
+    # the tabs callback takes the store and year as inputs, the slider callbacks as state
+    state = [] if output == 'content.children' else selection
+    inputs = inputs + (selection if output == 'content.children' else [])
+    return {
+        'output': output,
+        'outputs': dict(zip(['id', 'property'], output.split('.'))),
+        'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+        'state': [{'id': i, 'property': p, 'value': v} for i, p, v in state],
+        'changedPropIds': [f'{inputs[0][0]}.{inputs[0][1]}'],
+    }
+
+
+# Runs inside the fresh interpreter, with SALES_DATA_DIR and SALES_CACHE_DIR set
+def worker(phase):
+    results = []
+    sys.path.insert(0, str(SRC))
+    started = time.perf_counter()
+    import app
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    results.append({'step': f'module load ({phase})', 'seconds': time.perf_counter() - started, 'peak_bytes': peak_rss})
+
+    selection = app.default_selection
+    if phase == 'lazy':
+        body = callback_body('content.children', [('tabs', 'value', 'tab-2')], app.DATASET_VERSION, selection)
+        started = time.perf_counter()
+        assert app.server.test_client().post('/_dash-update-component', json=body).status_code == 200
+        results.append({'step': 'first weather tab request (lazy)', 'seconds': time.perf_counter() - started, 'peak_bytes': None})
+        return results
+
+    started = time.perf_counter()
+    app.warm_thread.join()
+    results.append({'step': f'figure cache warm-up ({phase})', 'seconds': time.perf_counter() - started, 'peak_bytes': None})
+    if phase == 'cold':
+        return results
+
+    month = int(app.sales.select(*selection).cube.values('month')[0])
+    builders = [
+        ('update_heatmap', app.update_heatmap, *selection, 'Friday'),
+        ('generate_employee_area_chart', app.generate_employee_area_chart, *selection, 'Friday'),
+        ('update_scatterplot', app.update_scatterplot, *selection, month),
+        ('update_pie_chart', app.update_pie_chart, *selection),
+        ('the_greek', app.the_greek, *selection),
+        ('update_subplot_graph', app.update_subplot_graph, *selection),
+        ('update_revenue_cost_rainfall_graph', app.update_revenue_cost_rainfall_graph, *selection),
+    ]
+    # one untimed run of each builder first: update_scatterplot imports plotly.express on
+    # its first call, and plotly sets up each trace type the first time it's drawn. Those
+    # one-off costs would otherwise be timed as the builders'
+    for name, builder, *args in builders:
+        builder.__wrapped__(*args)
+    for name, builder, *args in builders:
+        seconds, peak = measure(builder.__wrapped__, *args)
+        results.append({'step': name, 'seconds': seconds, 'peak_bytes': peak})
+
+    client = app.server.test_client()
+    callbacks = [
+        ('callback tabs tab-2', 'content.children', [('tabs', 'value', 'tab-2')]),
+        ('callback tabs tab-3', 'content.children', [('tabs', 'value', 'tab-3')]),
+        ('callback day-slider heatmap', 'heatmap-graph.figure', [('day-slider', 'value', 4)]),
+        ('callback day-slider staffing', 'employee-area-chart.figure', [('day-slider', 'value', 4)]),
+        ('callback month-slider scatter', 'scatterplot.figure', [('month-slider', 'value', month)]),
+    ]
+    for name, output, inputs in callbacks:
+        body = callback_body(output, inputs, app.DATASET_VERSION, selection)
+        def post():
+            response = client.post('/_dash-update-component', json=body)
+            assert response.status_code == 200, response.status_code
+        seconds, peak = measure(post)
+        results.append({'step': name, 'seconds': seconds, 'peak_bytes': peak})
+    return results
+
+
+def run(rows):
+    sys.path.insert(0, str(BENCHMARKS))
+    from synthetic import generate
+
+    data_dir = BENCHMARKS.joinpath('.data', str(rows))
+    if not data_dir.joinpath('SQL_output.csv').exists():
+        generate(rows, data_dir)
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, SALES_DATA_DIR=str(data_dir), SALES_CACHE_DIR=cache_dir)
+        for phase in ['cold', 'warm']:
+            output = subprocess.run([sys.executable, __file__, '--worker', phase], env=env, check=True, capture_output=True, text=True).stdout
+            results.extend(json.loads(output.strip().splitlines()[-1]))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, SALES_DATA_DIR=str(data_dir), SALES_CACHE_DIR=cache_dir, LAZY_TABS='1')
+        output = subprocess.run([sys.executable, __file__, '--worker', 'lazy'], env=env, check=True, capture_output=True, text=True).stdout
+        results.extend(json.loads(output.strip().splitlines()[-1]))
+    for result in results:
+        result['rows'] = rows
+    return results
+
+
+def report(results):
+    print(f'{"rows":>10}  {"step":<40} {"ms":>10} {"peak MB":>10}')
+    for result in results:
+        peak = '' if result['peak_bytes'] is None else f'{result["peak_bytes"] / 1e6:.1f}'
+        print(f'{result["rows"]:>10}  {result["step"]:<40} {result["seconds"] * 1000:>10.1f} {peak:>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times and measures the dashboard on synthetic data of several sizes.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[50_000, 500_000, 5_000_000])
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker)))
+        sys.exit()
+
+    results = []
+    for rows in args.rows:
+        results.extend(run(rows))
+    report(results)
+    if args.output:
+        pathlib.Path(args.output).write_text(json.dumps(results, indent=2))
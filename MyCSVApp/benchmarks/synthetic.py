@@ -0,0 +1,192 @@
+import argparse
+import pathlib
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Synthetic SQL_output.csv generator. Writes order lines shaped like the output of
+# SQL/SQLQuery_2.sql (pizza_id, quantity, date, time, size, price, category,
+# pizza_type_id, ingredients) with lunch and dinner peaks and busier Fridays, for any
+# number of rows. Everything is generated chunk by chunk with array operations, so 50M
+# rows need no more memory than one chunk.
+#
+#   python benchmarks/synthetic.py --rows 1000000 --out /tmp/pizza-1m [--tables]
+#
+# --tables also writes the four source tables read by DATA_BACKEND=sql.
+RAINFALL_CSV = pathlib.Path(__file__).resolve().parent.parent.joinpath('src', 'data', '2015_RainFall.csv')
+
+# flavor: (category, ingredients)
+FLAVORS = {
+    'bbq_ckn': ('Chicken', 'Barbecued Chicken, Red Peppers, Green Peppers, Tomatoes, Red Onions, Barbecue Sauce'),
+    'cali_ckn': ('Chicken', 'Chicken, Artichoke, Spinach, Garlic, Jalapeno Peppers, Fontina Cheese, Gouda Cheese'),
+    'ckn_alfredo': ('Chicken', 'Chicken, Red Onions, Red Peppers, Mushrooms, Asiago Cheese, Alfredo Sauce'),
+    'ckn_pesto': ('Chicken', 'Chicken, Tomatoes, Red Peppers, Spinach, Garlic, Pesto Sauce'),
+    'southw_ckn': ('Chicken', 'Chicken, Tomatoes, Red Peppers, Red Onions, Jalapeno Peppers, Corn, Cilantro, Chipotle Sauce'),
+    'thai_ckn': ('Chicken', 'Chicken, Pineapple, Tomatoes, Red Peppers, Thai Sweet Chilli Sauce'),
+    'big_meat': ('Classic', 'Bacon, Pepperoni, Italian Sausage, Chorizo Sausage'),
+    'classic_dlx': ('Classic', 'Pepperoni, Mushrooms, Red Onions, Red Peppers, Bacon'),
+    'hawaiian': ('Classic', 'Sliced Ham, Pineapple, Mozzarella Cheese'),
+    'ital_cpcllo': ('Classic', 'Capocollo, Red Peppers, Tomatoes, Goat Cheese, Garlic, Oregano'),
+    'napolitana': ('Classic', 'Tomatoes, Anchovies, Green Olives, Red Onions, Garlic'),
+    'pep_msh_pep': ('Classic', 'Pepperoni, Mushrooms, Green Peppers'),
+    'pepperoni': ('Classic', 'Mozzarella Cheese, Pepperoni'),
+    'the_greek': ('Classic', 'Kalamata Olives, Feta Cheese, Tomatoes, Garlic, Beef Chuck Roast, Red Onions'),
+    'brie_carre': ('Supreme', 'Brie Carre Cheese, Prosciutto, Caramelized Onions, Pears, Thyme, Garlic'),
+    'calabrese': ('Supreme', 'Nduja Salami, Pancetta, Tomatoes, Red Onions, Friggitello Peppers, Garlic'),
+    'ital_supr': ('Supreme', 'Calabrese Salami, Capocollo, Tomatoes, Red Onions, Green Olives, Garlic'),
+    'peppr_salami': ('Supreme', 'Genoa Salami, Capocollo, Pepperoni, Tomatoes, Asiago Cheese, Garlic'),
+    'prsc_argla': ('Supreme', 'Prosciutto di San Daniele, Arugula, Mozzarella Cheese'),
+    'sicilian': ('Supreme', 'Coarse Sicilian Salami, Tomatoes, Green Olives, Luganega Sausage, Onions, Garlic'),
+    'soppressata': ('Supreme', 'Soppressata Salami, Fontina Cheese, Mozzarella Cheese, Mushrooms, Garlic'),
+    'spicy_ital': ('Supreme', 'Capocollo, Tomatoes, Goat Cheese, Artichokes, Peperoncini verdi, Garlic'),
+    'spinach_supr': ('Supreme', 'Spinach, Red Onions, Pepperoni, Tomatoes, Artichokes, Kalamata Olives, Garlic, Asiago Cheese'),
+    'five_cheese': ('Veggie', 'Mozzarella Cheese, Provolone Cheese, Smoked Gouda Cheese, Romano Cheese, Blue Cheese, Garlic'),
+    'four_cheese': ('Veggie', 'Ricotta Cheese, Gorgonzola Piccante Cheese, Mozzarella Cheese, Parmigiano Reggiano Cheese, Garlic'),
+    'green_garden': ('Veggie', 'Spinach, Mushrooms, Tomatoes, Green Olives, Feta Cheese'),
+    'ital_veggie': ('Veggie', 'Eggplant, Artichokes, Tomatoes, Zucchini, Red Peppers, Garlic, Pesto Sauce'),
+    'mediterraneo': ('Veggie', 'Spinach, Artichokes, Kalamata Olives, Sun-dried Tomatoes, Feta Cheese, Plum Tomatoes, Red Onions'),
+    'mexicana': ('Veggie', 'Tomatoes, Red Peppers, Jalapeno Peppers, Red Onions, Cilantro, Corn, Chipotle Sauce, Garlic'),
+    'spin_pesto': ('Veggie', 'Spinach, Artichokes, Tomatoes, Sun-dried Tomatoes, Garlic, Pesto Sauce'),
+    'veggie_veg': ('Veggie', 'Mushrooms, Tomatoes, Red Peppers, Green Peppers, Red Onions, Zucchini, Spinach, Garlic'),
+}
+SIZES = ['S', 'M', 'L', 'XL', 'XXL']
+SIZE_PRICES = np.array([12.0, 16.0, 20.5, 25.5, 35.95])
+SIZE_WEIGHTS = np.array([0.33, 0.34, 0.33, 0.0, 0.0])
+GREEK_SIZE_WEIGHTS = np.array([0.2, 0.2, 0.2, 0.3, 0.1])  # the only flavor sold in XL and XXL
+
+# Open 10:00 to 23:59, busiest at lunch and dinner
+HOURS = np.arange(10, 24)
+HOUR_WEIGHTS = np.array([0.1, 0.9, 1.5, 1.4, 0.6, 0.5, 0.8, 1.0, 0.95, 0.75, 0.6, 0.3, 0.1, 0.02])
+HOUR_WEIGHTS = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+# Monday to Sunday
+WEEKDAY_WEIGHTS = np.array([0.95, 0.95, 1.0, 1.05, 1.25, 1.1, 0.8])
+LINES_PER_ORDER = np.array([1, 2, 3, 4])
+LINES_WEIGHTS = np.array([0.45, 0.35, 0.12, 0.08])
+
+CHUNK_ORDERS = 400_000
+
+
+def time_strings():
+    seconds = np.arange(86400)
+    hours, minutes, secs = seconds // 3600, seconds // 60 % 60, seconds % 60
+    return np.array([f'{h:02d}:{m:02d}:{s:02d}' for h, m, s in zip(hours, minutes, secs)], dtype=object)
+
+
+class Catalog:
+    def __init__(self, rng):
+        self.flavors = np.array(list(FLAVORS), dtype=object)
+        self.categories = np.array([FLAVORS[f][0] for f in self.flavors], dtype=object)
+        self.ingredients = np.array([FLAVORS[f][1] for f in self.flavors], dtype=object)
+        self.popularity = rng.dirichlet(np.full(len(self.flavors), 8.0))
+        self.greek = list(self.flavors).index('the_greek')
+        # one price per pizza_id, a small markup per flavor on top of the size price
+        markup = rng.choice([0.0, 0.25, 0.5, 0.75, 1.0, 1.25], len(self.flavors))
+        self.prices = (SIZE_PRICES[None, :] + markup[:, None]).round(2)
+        self.pizza_ids = np.array([[f'{f}_{s.lower()}' for s in SIZES] for f in self.flavors], dtype=object)
+
+
+# One chunk of orders: returns (orders, lines) frames, lines hold the SQL_output.csv columns
+def generate_chunk(rng, catalog, n_orders, dates, date_weights, first_order_id, times):
+    order_dates = rng.choice(len(dates), n_orders, p=date_weights)
+    seconds = rng.choice(HOURS, n_orders, p=HOUR_WEIGHTS) * 3600 + rng.integers(0, 3600, n_orders)
+    chronological = np.lexsort((seconds, order_dates))
+    order_dates, seconds = order_dates[chronological], seconds[chronological]
+
+    lines = rng.choice(LINES_PER_ORDER, n_orders, p=LINES_WEIGHTS)
+    line_order = np.repeat(np.arange(n_orders), lines)
+    n_lines = len(line_order)
+    flavor = rng.choice(len(catalog.flavors), n_lines, p=catalog.popularity)
+    size = rng.choice(len(SIZES), n_lines, p=SIZE_WEIGHTS)
+    greek = flavor == catalog.greek
+    size[greek] = rng.choice(len(SIZES), greek.sum(), p=GREEK_SIZE_WEIGHTS)
+    quantity = np.where(rng.random(n_lines) < 0.02, 2, 1)
+
+    date_text = dates[order_dates]
+    time_text = times[seconds]
+    orders = pd.DataFrame({
+        'order_id': first_order_id + np.arange(n_orders),
+        'date': date_text,
+        'time': time_text,
+    })
+    lines = pd.DataFrame({
+        'pizza_id': catalog.pizza_ids[flavor, size],
+        'quantity': quantity,
+        'date': date_text[line_order],
+        'time': time_text[line_order],
+        'size': np.array(SIZES, dtype=object)[size],
+        'price': catalog.prices[flavor, size],
+        'category': catalog.categories[flavor],
+        'pizza_type_id': catalog.flavors[flavor],
+        'ingredients': catalog.ingredients[flavor],
+        'order_id': first_order_id + line_order,
+    })
+    return orders, lines
+
+
+def generate(rows, out, seed=0, start='2015-01-01', years=1, tables=False):
+    out = pathlib.Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    catalog = Catalog(rng)
+    times = time_strings()
+    calendar_days = pd.date_range(start, pd.Timestamp(start) + pd.DateOffset(years=years), inclusive='left')
+    dates = np.array(calendar_days.strftime('%Y-%m-%d'), dtype=object)
+    date_weights = WEEKDAY_WEIGHTS[calendar_days.dayofweek]
+    date_weights = date_weights / date_weights.sum()
+
+    mean_lines = (LINES_PER_ORDER * LINES_WEIGHTS).sum()
+    written, order_id, first = 0, 1, True
+    with open(out.joinpath('SQL_output.csv'), 'w', newline='') as sales:
+        orders_file = details_file = None
+        if tables:
+            orders_file = open(out.joinpath('pizza_orders.csv'), 'w', newline='')
+            details_file = open(out.joinpath('pizza_order_details.csv'), 'w', newline='')
+        while written < rows:
+            n_orders = int(min(CHUNK_ORDERS, (rows - written) / mean_lines + 1))
+            orders, lines = generate_chunk(rng, catalog, n_orders, dates, date_weights, order_id, times)
+            lines = lines.iloc[:rows - written]
+            orders = orders[orders['order_id'] <= lines['order_id'].max()]
+            lines.drop(columns='order_id').to_csv(sales, header=first, index=False)
+            if tables:
+                orders.to_csv(orders_file, header=first, index=False)
+                details = lines[['order_id', 'pizza_id', 'quantity']].copy()
+                details.insert(0, 'order_details_id', np.arange(written + 1, written + len(lines) + 1))
+                details.to_csv(details_file, header=first, index=False)
+            written += len(lines)
+            order_id += n_orders
+            first = False
+        if tables:
+            orders_file.close()
+            details_file.close()
+
+    if tables:
+        flavor, size = np.meshgrid(np.arange(len(catalog.flavors)), np.arange(len(SIZES)), indexing='ij')
+        sold = (size < 3) | (flavor == catalog.greek)
+        pd.DataFrame({
+            'pizza_id': catalog.pizza_ids[flavor, size][sold],
+            'pizza_type_id': catalog.flavors[flavor][sold],
+            'size': np.array(SIZES, dtype=object)[size][sold],
+            'price': catalog.prices[flavor, size][sold],
+        }).to_csv(out.joinpath('pizza_prices.csv'), index=False)
+        pd.DataFrame({
+            'pizza_type_id': catalog.flavors,
+            'name': catalog.flavors,
+            'category': catalog.categories,
+            'ingredients': catalog.ingredients,
+        }).to_csv(out.joinpath('pizza_types.csv'), index=False)
+
+    shutil.copy(RAINFALL_CSV, out.joinpath(RAINFALL_CSV.name))
+    return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes a synthetic SQL_output.csv of any size.')
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', default='2015-01-01')
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--tables', action='store_true', help='also write the four source tables for DATA_BACKEND=sql')
+    args = parser.parse_args()
+    generate(args.rows, args.out, args.seed, args.start, args.years, args.tables)
@@ -0,0 +1,52 @@
+import os
+import pathlib
+import sys
+
+# gunicorn reads this file from the directory it's started in, next to the Procfile. The
+# hooks run after its --chdir into src/.
+#
+# Before forking any worker, the master prepares every partition and the default selection
+# into the data cache: the frame, cube, ingredients and time index, all as flat numeric and
+# categorical code arrays (see data_cache.py). Workers then only memory-map those files
+# read-only. There are no Python objects per row whose refcounts would dirty the pages, so
+# every worker shares the same physical pages through the OS page cache. Point
+# SALES_CACHE_DIR at /dev/shm to keep them in RAM. The master also removes the figure
+# cache of earlier data and code versions (see figure_cache.py).
+#
+# The app itself isn't preloaded, because its warm-up and live-sales threads wouldn't
+# survive the fork.
+
+
+def on_starting(server):
+    # the snapshot server (see src/snapshot.py) has no data to prepare
+    if server.app.app_uri == 'snapshot:server':
+        return
+    from figure_cache import FigureCache
+    from partitions import ALL, SalesPartitions, sql_partitions
+    from payloads import COMPACT_RESPONSES, pack_figure
+
+    # with LAZY_TABS=1 the partitions are only versioned, the workers prepare what their
+    # first requests need
+    lazy = os.environ.get('LAZY_TABS') == '1'
+    data_path = pathlib.Path(os.environ.get('SALES_DATA_DIR', pathlib.Path(__file__).parent.joinpath('src', 'data'))).resolve()
+    if os.environ.get('DATA_BACKEND', 'pandas') == 'sql':
+        sales = SalesPartitions(sql_partitions(data_path), lazy=lazy)
+    else:
+        sales = SalesPartitions.discover(data_path, lazy=lazy)
+    # figures of earlier data or code versions, before any worker writes new ones
+    FigureCache(sales.version, encode=pack_figure if COMPACT_RESPONSES else None).prune()
+    if lazy:
+        return
+    sales.select(ALL, sales.years[-1])
+    server.log.info('sales data prepared for %d partition(s)', len(sales.partitions))
+
+
+# How long each stage of the worker's startup took (see metrics.Startup)
+def post_worker_init(worker):
+    app = sys.modules.get('app')
+    if app is None:
+        return
+    if app.startup.over_budget():
+        worker.log.warning('app %s', app.startup.report())
+    else:
+        worker.log.info('app %s', app.startup.report())
@@ -1,19 +1,42 @@
+import time
+STARTED = time.perf_counter() # the startup report counts the imports too (see metrics.Startup)
+import os
 import pathlib
 import pandas as pd
 import calendar
-import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
-import plotly.express as px
-import plotly.subplots as sp
+import functools
+import threading
+from dash.dependencies import ClientsideFunction, Input, Output, State
 import plotly.graph_objects as go
-from dash import Dash, html, dcc
+from plotly.colors import sequential
+from dash import Dash, html, dcc, ctx, no_update
+from dash.exceptions import PreventUpdate
 import numpy as np
 from plotly.subplots import make_subplots
-
-
+import cost_model
+from cost_model import annual_savings, costs_after, costs_before
+from figure_cache import FigureCache
+from forecast import DemandForecast
+from live import LIVE_POLL_SECONDS, LIVE_SALES, LiveSales
+import metrics
+from metrics import measure
+from partitions import ALL, SalesPartitions, sql_partitions
+import payloads
+from payloads import COMPACT_RESPONSES, pack_figure
+from streaming import STREAMING_BUILD
+from prepare import day_order
+import ingredients
+import staffing
+import timeline
+from staffing import NOTEBOOK_THRESHOLDS, PROPOSED_WEEKDAY, PROPOSED_WEEKEND, current_staff, hourly_demand, required_staff, schedule
+
+
+
+startup = metrics.Startup(STARTED)
+startup.stage('imports')
 
 PATH = pathlib.Path(__file__).parent
-DATA_PATH = PATH.joinpath("data").resolve()
+DATA_PATH = pathlib.Path(os.environ.get("SALES_DATA_DIR", PATH.joinpath("data"))).resolve() # SALES_DATA_DIR points the app at another data folder
 
 external_stylesheets = ['https://fonts.googleapis.com/css2?family=Roboto:wght@400;700&display=swap',
                         'https://codepen.io/chriddyp/pen/bWLwgP.css']
@@ -21,50 +44,89 @@ app = Dash(__name__, external_stylesheets=external_stylesheets)
 
 server= app.server
 
-df = pd.read_csv(DATA_PATH.joinpath("SQL_output.csv"))
-rain = pd.read_csv(DATA_PATH.joinpath("2015_RainFall.csv"))
-
-df.rename(columns={'pizza_type_id': 'pizza_flavor'}, inplace=True) # I think this name is more appropriate
-
-
-# Splitting the date into month and days
-df['date'] = pd.to_datetime(df['date'])
-df['month'] = df['date'].dt.month
-df['day'] = df['date'].dt.day
-df['day_of_week'] = df['date'].dt.day_name()
-day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday','Sunday']
-df['hour'] = pd.to_datetime(df['time']).dt.hour
-
-# Creating order id
-df['order_id'] = df['month'].apply(lambda x: str(x).zfill(2)) + df['day'].apply(lambda x: str(x).zfill(2)) + df['time']
-
-# Create 'multiple_orders' column, 1 if the order_id is duplicated, 0 if not
-df['multiple_orders'] = df.duplicated('order_id').astype(int)
-
-# Fixing typing errors in 'ingredients' column
-df['ingredients'] = df['ingredients'].str.replace(', ', ',') # one space
-df['ingredients'] = df['ingredients'].str.replace(',  ', ',') # two spaces after comma
-
-
-ingredients_dummies = df['ingredients'].str.get_dummies(',')
-
-# Add the new columns to the original DataFrame
-df = pd.concat([df, ingredients_dummies], axis=1)
-df = df.drop('ingredients', axis=1) # Drop the OG 'ingredients' column
-
-hourly_sum_quantity = df.groupby(['day_of_week', 'hour'])['quantity'].sum()
-hourly_df = hourly_sum_quantity.reset_index(name='Total Orders sold at this hour of this day')
-
-weekday_employee_count = {
-    10: 0, 11: 4, 12: 6, 13: 6, 14: 6, 15: 3, 16: 3, 17: 4, 18: 3, 19: 2, 20: 2, 21: 1, 22: 1, 23: 0
-}
+# With CLIENTSIDE_SLIDERS=1 the figures for every slider position are sent along with
+# tabs 1 and 4, and moving a slider is handled in the browser (assets/clientside.js)
+CLIENTSIDE_SLIDERS = os.environ.get('CLIENTSIDE_SLIDERS') == '1'
+
+# With BACKGROUND_CALLBACKS=1 the tab and slider callbacks run as jobs in a local process
+# pool (see jobs.py), so a heavy selection doesn't hold up the worker, and the page shows
+# what they're working on
+BACKGROUND_CALLBACKS = os.environ.get('BACKGROUND_CALLBACKS') == '1'
+
+# With LAZY_TABS=1 nothing is prepared or warmed before the first request that needs it:
+# partitions are only versioned at startup, and each tab loads its selection when it's
+# first opened. Workers boot faster, the first visit to each tab is slower
+#
+# Either way, modules that take a while to import and that only some figures or settings
+# need (plotly.express, scipy.sparse, sqlite3 for DATA_BACKEND=sql, jobs.py) are imported
+# inside the function that first uses them, not at the top of their module
+LAZY_TABS = os.environ.get('LAZY_TABS') == '1'
+
+# DATA_BACKEND=sql answers the figures with SQL against the four source tables
+# (data/pizza_*.csv) loaded into SQLite, without building the joined frame (see sql_store.py)
+DATA_BACKEND = os.environ.get('DATA_BACKEND', 'pandas')
+
+with measure('stage', 'discover_sales'):
+    if DATA_BACKEND == 'sql':
+        if LIVE_SALES:
+            raise ValueError('LIVE_SALES needs DATA_BACKEND=pandas')
+        sales = SalesPartitions(sql_partitions(DATA_PATH), lazy=LAZY_TABS)
+    else:
+        # Orders are partitioned by store and year (see partitions.py). Each partition is
+        # prepared once and then memory-mapped from the cache (see data_cache.py), and every
+        # figure reads from the pre-aggregated cube of the selected partitions (see cube.py)
+        sales = SalesPartitions.discover(DATA_PATH, lazy=LAZY_TABS)
+DATASET_VERSION = sales.version
+DEFAULT_STORE = ALL
+DEFAULT_YEAR = sales.years[-1]
+
+# Built figures are shared by all workers and reused until the data changes (see figure_cache.py)
+figure_cache = FigureCache(DATASET_VERSION, encode=pack_figure if COMPACT_RESPONSES else None)
+
+background_options = {}
+if BACKGROUND_CALLBACKS:
+    from jobs import LocalJobManager # only loaded (with dash.long_callback and a process pool) when it's used
+    if LIVE_SALES:
+        raise ValueError('BACKGROUND_CALLBACKS needs LIVE_SALES off, the jobs would draw from a copy of the sales taken when their process started')
+
+    # locks another thread of the worker may have held when a job process was forked, and
+    # SQLite connections, which the job process can't share with the worker
+    def after_fork():
+        figure_cache.build_lock = threading.Lock()
+        sales.lock = threading.Lock()
+        metrics.registry.lock = threading.Lock()
+        if DATA_BACKEND == 'sql':
+            for partition in sales.partitions:
+                partition.cube.pool.reopen()
+
+    background_options = dict(
+        background=True,
+        manager=LocalJobManager(lambda: figure_cache.version, after_fork=after_fork),
+        interval=500,
+        progress=[Output('job-progress', 'children')],
+        progress_default=[''],
+    )
 
-weekend_employee_count = {
-    10: 0, 11: 3, 12: 3, 13: 4, 14: 4, 15: 3, 16: 3, 17: 4, 18: 4, 19: 3, 20: 3, 21: 2, 22: 1, 23: 0
-}
-# set the default employee count to 6 between 10am and 8pm, and 4 otherwise
-# This is a very simple model, but it's a good starting point 
-# used to find differences in employee count before and after changes
+# With LIVE_SALES=1, order lines dropped in data/incoming (or posted to /api/orders)
+# are folded into the cube as they arrive (see live.py)
+live_sales = None
+if LIVE_SALES:
+    if len(sales.partitions) > 1:
+        raise ValueError('LIVE_SALES needs a single store and year')
+    if STREAMING_BUILD:
+        raise ValueError('LIVE_SALES needs STREAMING_BUILD off, it adds to the order lines')
+    partition = sales.partitions[0].load()
+    live_sales = LiveSales(partition, DATASET_VERSION, DATA_PATH.joinpath('incoming'), on_update=figure_cache.set_version)
+    live_sales.register_routes(server)
+    live_sales.poll()
+    live_sales.watch()
+
+# staffing schedule proposed on the dashboard, [weekday, hour]
+proposed_staff = schedule(PROPOSED_WEEKDAY, PROPOSED_WEEKEND)
+staffing.register_routes(server, sales)
+ingredients.register_routes(server, sales)
+timeline.register_routes(server, sales)
+startup.stage('sales')
 
 
 
@@ -94,6 +156,9 @@ tab_selected_style = {
     'border-right': '2px solid #1975FA'  
 }
 
+def year_options(store):
+    return [{'label': 'All years', 'value': ALL}] + [{'label': str(year), 'value': year} for year in sales.years_of(store)]
+
 app.layout = html.Div(style={
     'backgroundColor': '#303030',  # Dark background always\
     'code': '{background-color: #7FDBFF; color: #7FDBFF;}',  # Code block color
@@ -104,24 +169,57 @@ app.layout = html.Div(style={
     'padding': '90px'  # Padding everywhere
 }, children=[
     html.H1("Python for Business Analytics - Jean Batista (B.A)", style={'color': '#FFFFFF','textAlign': 'center','fontSize':'30px','marginBottom': '20px'}), # center text color white 
+    # store and year of the sales shown, hidden when there is only one of each
+    html.Div([
+        dcc.Dropdown(id='store-dropdown', options=[{'label': 'All stores', 'value': ALL}] + [{'label': store, 'value': store} for store in sales.stores],
+                     value=DEFAULT_STORE, clearable=False, style={'width': '220px', 'color': '#303030'}),
+        dcc.Dropdown(id='year-dropdown', options=year_options(DEFAULT_STORE), value=DEFAULT_YEAR, clearable=False, style={'width': '160px', 'color': '#303030'}),
+    ], style={'display': 'flex', 'gap': '20px', 'marginBottom': '20px'} if len(sales.partitions) > 1 else {'display': 'none'}),
     dcc.Tabs(id="tabs", value='tab-0', children=[
         dcc.Tab(label='Introduction', value='tab-0', style=tab_style, selected_style=tab_selected_style),
         dcc.Tab(label='Peak Hours and Operating costs', value='tab-1', style=tab_style, selected_style=tab_selected_style),
         dcc.Tab(label='The weather affects demand', value='tab-2', style=tab_style, selected_style=tab_selected_style),
         dcc.Tab(label='Pie Sizes', value='tab-3', style=tab_style, selected_style=tab_selected_style),
         dcc.Tab(label='Pizza toppings popularity', value='tab-4', style=tab_style, selected_style=tab_selected_style),
+        dcc.Tab(label='Pizza pairings', value='tab-6', style=tab_style, selected_style=tab_selected_style),
         dcc.Tab(label='Conclusion', value='tab-5', style=tab_style, selected_style=tab_selected_style),
     ], style=tabs_styles),
-    html.Div(id='content')
+    html.Div(id='job-progress', style={'color': '#7FDBFF', 'minHeight': '20px'}),
+    html.Div(id='content'),
+    # the latest sales version this page has drawn, and what the last live update touched
+    dcc.Store(id='live-version', data={'version': DATASET_VERSION, 'days': [], 'months': []}),
+    dcc.Interval(id='live-interval', interval=LIVE_POLL_SECONDS * 1000, disabled=not LIVE_SALES),
 ])
 
 # Define the callback to update the content based on the selected tab
 @app.callback(
     Output('content', 'children'),
-    Input('tabs', 'value')
+    Input('tabs', 'value'),
+    Input('live-version', 'data'),
+    Input('store-dropdown', 'value'),
+    Input('year-dropdown', 'value'),
+    **background_options
 )
 
-def render_content(tab):
+def render_content(tab, live, store, year):
+    # live updates redraw the tabs whose figures are built in here, the slider
+    # graphs are refreshed by their own callbacks
+    live_tabs = ['tab-2', 'tab-3', 'tab-6'] + (['tab-1', 'tab-4'] if CLIENTSIDE_SLIDERS else [])
+    if ctx.triggered_id == 'live-version' and tab not in live_tabs:
+        return no_update
+    return memoized_tab_content(figure_cache.version, tab, store, year)
+
+
+# Each tab is built once per dataset version, store and year
+@functools.lru_cache(maxsize=64)
+def memoized_tab_content(version, tab, store, year):
+    with measure('tab', tab):
+        return tab_content(tab, store, year)
+
+
+# Everything a tab shows for a store and year, also pre-rendered by snapshot.py. Only the
+# tabs with figures touch the sales data
+def tab_content(tab, store, year):
     if tab == 'tab-0':
         return html.Div([
             html.H2('A restaurant owner states: “ I am looking to open a pizza restaurant, what suggestions do you have for success?" ', style={'color': '#FFFFFF','marginTop': '135px','fontSize': '30px','textAlign': 'center'}),  # Title
@@ -149,6 +247,8 @@ def render_content(tab):
                 value=0,
                 step=None,
             ),
+            dcc.Store(id='heatmap-store', data=day_slider_store(update_heatmap, store, year)) if CLIENTSIDE_SLIDERS else None,
+            dcc.Store(id='employee-store', data=day_slider_store(generate_employee_area_chart, store, year)) if CLIENTSIDE_SLIDERS else None,
             html.Div([
                 dcc.Graph(id='heatmap-graph'),
                 html.Div(
@@ -188,7 +288,7 @@ def render_content(tab):
             ),
             dcc.Graph(
                 id='subplot-graph',
-                figure=update_subplot_graph()
+                figure=update_subplot_graph(store, year)
             ),
             html.P('The rainfall has an impact on sales, likely due to consumer behavior. The business can use weather forecasts to know before-hand if their sales are to be affected that month, and can save money by planning ahead. I was able to change operating costs so that the business can manage factors like ordering & prepping ingredients, overstaffing, etc. The $ difference is estimated using a formula that standardizes operating costs based on orders made each month in relation to rain that month.', style={'fontSize': '20px', 'color': '#7FDBFF','marginBottom': '45px', 'marginTop': '35px', 'textAlign': 'center'}),
             html.H2('Average Operating Cost', style={'color': '#FFFFFF','fontSize': '24px'}),
@@ -202,7 +302,19 @@ def render_content(tab):
             ),
             dcc.Graph(
                 id='cost-rainfall-graph',
-                figure=update_revenue_cost_rainfall_graph()
+                figure=update_revenue_cost_rainfall_graph(store, year)
+            ),
+            html.Div(
+                'Weather and demand vary from year to year. The graph below prices many simulated years of rainfall and sales around the ones observed, with the same formula.',
+                style={
+                    'fontSize': '18px',  
+                    'marginBottom': '20px',  
+                    'marginTop': '35px'  
+                }
+            ),
+            dcc.Graph(
+                id='cost-simulation-graph',
+                figure=update_cost_simulation_graph(store, year)
             ),
             html.Div([
             html.H2('Proposed Changes:', style={'color': '#FFFFFF','fontSize': '24px'}),
@@ -210,7 +322,8 @@ def render_content(tab):
                 html.P([ # calls back to formula used to estimate the difference in operating costs
                 'After estimating the difference in operating costs, using the weather based formula, I assisted this restaurant cut costs by about ',
                 html.Span('$30,780 anually', style={'fontWeight': 'bold', 'color': '#5ae959'}), 
-                ' (6% reduction).'
+                ' (6% reduction). ',
+                cost_savings_range(store, year),
             ], style={'color': '#7FDBFF', 'fontSize': '25px', 'marginBottom': '25px', 'marginRight': '75px', 'marginLeft': '75px'}),
         ])
         ])
@@ -221,12 +334,12 @@ def render_content(tab):
         html.Div([
             dcc.Graph(
                 id='pie-chart',
-                figure=update_pie_chart(),
+                figure=update_pie_chart(store, year),
                 style={'width': '48%', 'display': 'inline-block', 'marginTop': '70px'}
             ),
             dcc.Graph(
                 id='the-greek',
-                figure=the_greek(),
+                figure=the_greek(store, year),
                 style={'width': '48%', 'display': 'inline-block','marginTop': '70px'}
             )
         ], style={'display': 'flex', 'justifyContent': 'space-between'}),
@@ -250,18 +363,20 @@ def render_content(tab):
         ])
     ])
     elif tab == 'tab-4': 
+        months = sales.select(store, year).cube.values('month')
         return html.Div([
             html.H2('Popularity per Topping Group', style={'color': '#FFFFFF','fontSize': '24px', 'marginTop': '40px', 'marginBottom': '25px'}),  
             html.Label("Select a month:", style={'font-weight': 'bold', 'display': 'block', 'margin-bottom': '5px'}),
             dcc.Slider( # Slider for selecting the month, for popularity per topping group
                 id='month-slider',
-                min=df['month'].min(),
-                max=df['month'].max(),
-                value=df['month'].min(),
+                min=int(months[0]),
+                max=int(months[-1]),
+                value=int(months[0]),
                 marks={int(i): {'label': calendar.month_name[i], 'style': {'transform': 'rotate(-45deg)', 'white-space': 'nowrap'}} # labeling months on slider
-       for i in df['month'].unique()},
+       for i in months},
                 step=None,
             ),
+            dcc.Store(id='scatter-store', data=month_slider_store(update_scatterplot, store, year)) if CLIENTSIDE_SLIDERS else None,
             html.Div(
                 id='selected-pizza-stats',
                 # This will display the selected pizza statistics, add some space below this div
@@ -270,10 +385,31 @@ def render_content(tab):
             dcc.Graph(
                 id='scatterplot',
                 # Call the function with the default slider value
-                figure=update_scatterplot(df['month'].min()),
+                figure=update_scatterplot(store, year, int(months[0])),
                 style={'margin-top': '20px'}  
             )
         ])
+    elif tab == 'tab-6':
+        return html.Div([
+            html.H2('Which pizzas are ordered together?', style={'color': '#FFFFFF','fontSize': '24px', 'marginTop': '40px', 'marginBottom': '25px', 'textAlign': 'center'}),
+            html.P('Lines sharing an order time are grouped back into orders. Lift compares how often two flavors share an order with how often they would if customers picked them independently: above 1 they go together, below 1 they replace each other. Good bundle candidates have a high lift and enough orders behind it.',
+                   style={'fontSize': '20px', 'color': '#7FDBFF', 'marginBottom': '20px', 'textAlign': 'center'}),
+            dcc.Graph(
+                id='basket-lift-heatmap',
+                figure=update_basket_lift_heatmap(store, year)
+            ),
+            dcc.Graph(
+                id='basket-rules-table',
+                figure=update_basket_rules_table(store, year)
+            ),
+            html.H2('What do customers order next to an XL or XXL pizza?', style={'color': '#FFFFFF','fontSize': '24px', 'marginTop': '40px', 'marginBottom': '25px', 'textAlign': 'center'}),
+            html.P('The Greek is the only flavor sold in XL & XXL. Flavors that are already ordered next to those sizes more than average are the first candidates to offer in XL & XXL too.',
+                   style={'fontSize': '20px', 'color': '#7FDBFF', 'marginBottom': '20px', 'textAlign': 'center'}),
+            dcc.Graph(
+                id='upsell-chart',
+                figure=update_upsell_chart(store, year)
+            ),
+        ])
     elif tab == 'tab-5':
         return html.Div([
             html.H2('Overview ', style={'color': '#FFFFFF','marginTop': '80px','fontSize': '30px','textAlign': 'center'}),  # Title
@@ -347,56 +483,144 @@ def style_graph(graph):
     )
     return graph
 
-# Slider tab 1 callback
+# Registers a slider callback on the server, unless the sliders are handled clientside
+def slider_callback(*args):
+    def register(function):
+        if not CLIENTSIDE_SLIDERS:
+            app.callback(*args, **background_options)(function)
+        return function
+    return register
+
+
+# Everything the browser needs to redraw a graph for each slider value: the layout
+# of the first figure, then per value its traces and the layout keys that differ
+def slider_store(figures):
+    layout = next(iter(figures.values()))['layout']
+    return {
+        'layout': layout,
+        'states': {
+            str(value): {
+                'data': figure['data'],
+                'layout': {key: item for key, item in figure['layout'].items() if layout.get(key) != item},
+            }
+            for value, figure in figures.items()
+        },
+    }
+
+def day_slider_store(builder, store, year):
+    return slider_store({i: builder(store, year, day) for i, day in enumerate(day_order)})
+
+def month_slider_store(builder, store, year):
+    return slider_store({int(month): builder(store, year, int(month)) for month in sales.select(store, year).cube.values('month')})
+
+
+# Offers the years the selected store has sales for
 @app.callback(
+    Output('year-dropdown', 'options'),
+    Output('year-dropdown', 'value'),
+    Input('store-dropdown', 'value'),
+    State('year-dropdown', 'value'),
+    prevent_initial_call=True
+)
+def update_year_options(store, year):
+    options = year_options(store)
+    if year in [option['value'] for option in options]:
+        return options, no_update
+    return options, sales.years_of(store)[-1]
+
+
+# Polls this worker for live sales ingested since the version the page has drawn
+if LIVE_SALES:
+    @app.callback(
+        Output('live-version', 'data'),
+        Input('live-interval', 'n_intervals'),
+        State('live-version', 'data')
+    )
+    def check_live_sales(n_intervals, live):
+        changes = live_sales.changes_since(live['version'])
+        if changes is None:
+            raise PreventUpdate
+        return changes
+
+
+# False when a live update fired the callback but didn't touch this day or month
+def affected_by_live_update(live, day=None, month=None):
+    if ctx.triggered_id != 'live-version':
+        return True
+    return day in live['days'] or month in live['months']
+
+
+# Slider tab 1 callback
+@slider_callback(
     Output('heatmap-graph', 'figure'),
-    Input('day-slider', 'value')
+    Input('day-slider', 'value'),
+    Input('live-version', 'data'),
+    State('store-dropdown', 'value'),
+    State('year-dropdown', 'value')
 )
 
-def update_graph(day_index):
+def update_graph(day_index, live, store, year):
     day = day_order[day_index]
-    return update_heatmap(day)
-
-def update_heatmap(day):
-    filtered_df = df[df['day_of_week'] == day]
-    pizza_type_counts = filtered_df['pizza_flavor'].value_counts()
-    popular_pizza_types = pizza_type_counts.nlargest(15).index.tolist() # for visibility. 
-    filtered_df = filtered_df[filtered_df['pizza_flavor'].isin(popular_pizza_types)] # 32 pizza flavors were too much
-    filtered_df['hour'] = pd.to_numeric(filtered_df['hour'])  
-    filtered_df = filtered_df.sort_values('hour')  
-    filtered_df['quantity'] = filtered_df['quantity'] / 52 # divide by 52 weeks to get average per week, rather than total per year
-    heatmap_fig = px.density_heatmap(filtered_df, x='hour', y='pizza_flavor', z='quantity', color_continuous_scale='ice')
-    heatmap_fig.update_layout(xaxis={'type': 'category'})
-    heatmap_fig.update_coloraxes(colorbar_title="Average sales")  # Update color bar title
+    if not affected_by_live_update(live, day=day):
+        return no_update
+    return update_heatmap(store, year, day)
+
+@figure_cache.cached
+def update_heatmap(store, year, day):
+    selection = sales.select(store, year)
+    cube = selection.cube
+    pizza_type_counts = cube.query('lines', by='pizza_flavor', day_of_week=day)
+    popular_pizza_types = pizza_type_counts.nlargest(15).index.tolist() # for visibility. 32 pizza flavors were too much
+    hourly_sales = cube.query('quantity', by=['pizza_flavor', 'hour'], day_of_week=day, pizza_flavor=popular_pizza_types)
+
+    # Bin hour x flavor here rather than in the browser, so the figure only carries
+    # the 15 x 14 matrix whatever the number of order lines
+    matrix = hourly_sales.unstack('hour', fill_value=0).reindex(popular_pizza_types[::-1], fill_value=0) # most popular on top
+    matrix = matrix / selection.calendar.weekdays[day] # divide by the number of these weekdays to get average per week, rather than the total
+    heatmap_fig = go.Figure(go.Heatmap(
+        z=matrix.to_numpy(),
+        x=matrix.columns.tolist(),
+        y=matrix.index.tolist(),
+        coloraxis='coloraxis',
+        hovertemplate='hour=%{x}<br>pizza_flavor=%{y}<br>Average sales=%{z}<extra></extra>'
+    ))
+    heatmap_fig.update_layout(
+        xaxis={'type': 'category', 'title': 'hour'},
+        yaxis={'type': 'category', 'title': 'pizza_flavor'},
+        coloraxis={'colorscale': sequential.ice, 'colorbar': {'title': 'Average sales'}}, # Update color bar title
+    )
 
     return style_graph(heatmap_fig)
 
 
-@app.callback(
+@slider_callback(
     Output('employee-area-chart', 'figure'),
-    [Input('day-slider', 'value')]
+    [Input('day-slider', 'value'), Input('live-version', 'data')],
+    [State('store-dropdown', 'value'), State('year-dropdown', 'value')]
 )
 
-def update_employee_area_chart(day_index):
+def update_employee_area_chart(day_index, live, store, year):
     day = day_order[day_index]
-    return generate_employee_area_chart(day)
-
-def generate_employee_area_chart(day):
-    daily_data = df[df['day_of_week'] == day]
-
-    # Group by hour and calculate sum of quantity, 
-    # then apply a function that determines the number of employees needed
-    # based on the sum of quantity
-    hourly_sum = daily_data.groupby('hour')['quantity'].sum()
-
-    if day in ['Saturday', 'Sunday']:
-        employee_count_structure = weekend_employee_count
-    else:
-        employee_count_structure = weekday_employee_count
-    
-    hourly_employee_count = hourly_sum.index.to_series().map(employee_count_structure).fillna(0)
-    # Calculate default_employee_count dynamically
-    default_employee_count = hourly_sum.index.to_series().apply(lambda x: 5 if 10 < x < 20 else 3)
+    if not affected_by_live_update(live, day=day):
+        return no_update
+    return generate_employee_area_chart(store, year, day)
+
+@figure_cache.cached
+def generate_employee_area_chart(store, year, day):
+    # Quantity by weekday and hour, as a [7, 24] array (see staffing.py),
+    # then the number of employees before and after the changes
+    # for every hour with sales on that day
+    selection = sales.select(store, year)
+    demand = hourly_demand(selection.cube, selection.calendar.weekdays)
+    row = day_order.index(day)
+    hours = np.flatnonzero(demand[row] > 0)
+
+    hourly_employee_count = pd.Series(proposed_staff[row, hours], index=hours)
+    default_employee_count = pd.Series(current_staff(demand)[row, hours], index=hours)
+    # employees the notebook's thresholds call for with next week's forecast demand
+    forecast = demand_forecast(figure_cache.version, store, year)
+    forecast_demand = forecast.next_week().sum(axis=0)
+    forecast_employee_count = pd.Series(required_staff(forecast_demand, thresholds=NOTEBOOK_THRESHOLDS)[0][row, hours], index=hours)
 
     # create the line for employee count before changes made 
     area_chart_fig = go.Figure()
@@ -415,6 +639,13 @@ def generate_employee_area_chart(day):
         line=dict(color='green'),
         name='Employee Count After'
     ))
+    area_chart_fig.add_trace(go.Scatter(
+        x=forecast_employee_count.index,
+        y=forecast_employee_count,
+        mode='lines',
+        line=dict(color='#7FDBFF', dash='dot'),
+        name=f'Employees needed next week (forecast for {calendar.month_name[forecast.next_week_month]})'
+    ))
 
     # Update layout
     area_chart_fig.update_layout(
@@ -428,17 +659,19 @@ def generate_employee_area_chart(day):
 
 
 
-def update_subplot_graph():
-    results = df.groupby('month')['order_id'].count()
-    months = list(range(1, 13))
-    days_in_month = [calendar.monthrange(2015, month)[1] for month in months]
+@figure_cache.cached
+def update_subplot_graph(store, year):
+    selection = sales.select(store, year)
+    results = selection.cube.query('lines', by='month')
+    months = results.index.tolist()
+    days_in_month = selection.calendar.days_per_month[months] # days of each month in the selected dates
     adjusted_quantity = results / days_in_month 
-    rainfall = rain.groupby('month').sum()
+    rainfall = selection.rain
 
     # Create the subplot fig
-    fig = sp.make_subplots(specs=[[{"secondary_y": True}]])
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
     fig.add_trace(go.Scatter(x=months, y=adjusted_quantity, name='Sales', line=dict(color='green')), secondary_y=False)
-    fig.add_trace(go.Scatter(x=months, y=rainfall['rainfall'], name='Rainfall', line=dict(color='#3076ff')), secondary_y=True)
+    fig.add_trace(go.Scatter(x=rainfall.index.tolist(), y=rainfall['rainfall'], name='Rainfall', line=dict(color='#3076ff')), secondary_y=True)
     fig.update_layout(
         xaxis=dict(title='Month', dtick=1),
         yaxis=dict(
@@ -460,39 +693,61 @@ def update_subplot_graph():
     )
     return style_graph(fig)
 
-def update_revenue_cost_rainfall_graph():
-    # Assumes df and rain are pre-loaded DataFrames with relevant data
-    rainfall_data = rain.groupby('month').sum()
-    results = df.groupby('month')['price'].sum()
-    months = list(range(1, 13))
-    days_in_month = [calendar.monthrange(2015, month)[1] for month in months]
-    adjusted_quantity = results / days_in_month 
-    operating_costs = (adjusted_quantity * .4) + 500 # Adjust based on realistic business costs
-
-    # Dynamic cost multiplier inversely proportional to rainfall
-    base_cost_multiplier = 250
-    max_rainfall = rainfall_data['rainfall'].max()
-    normalized_rainfall = rainfall_data['rainfall'] / max_rainfall
-    dynamic_cost_multiplier = 1 - normalized_rainfall  # Inverse relationship
-
-    # Calculate optimized operating costs purely based on inverse rainfall relationship
-    # Here, we adjust the base cost multiplier inversely with the normalized rainfall
-    min_operating_cost = 1200  # Adjust based on realistic business costs
-    optimized_operating_costs = (base_cost_multiplier * dynamic_cost_multiplier) + min_operating_cost
-
-    # Ensure operating costs do not fall below the minimum threshold
-
-    optimized_operating_costs = np.maximum(optimized_operating_costs, min_operating_cost)
-
-    # Adding variability
-    offset_percentage = 0.1
-    variable_offset = optimized_operating_costs * offset_percentage
+# Revenue per day and rainfall of each month, for the selected stores and years
+def monthly_cost_inputs(store, year):
+    selection = sales.select(store, year)
+    results = selection.cube.query('price', by='month')
+    months = results.index.tolist()
+    days_in_month = selection.calendar.days_per_month[months]
+    return results / days_in_month, selection.rain['rainfall']
+
+
+# Next week's demand for every flavor x weekday x hour of a selection (see forecast.py),
+# fitted again for every dataset version
+@functools.lru_cache(maxsize=32)
+def demand_forecast(version, store, year):
+    selection = sales.select(store, year)
+    with measure('stage', 'demand_forecast'):
+        return DemandForecast(selection.cube, selection.calendar, selection.rain)
+
+
+# Shown instead of the simulation when the selection has no rainfall for some month
+NO_RAINFALL = 'There is no rainfall data for this selection, so the savings could not be simulated.'
+
+
+# The uncertainty of the savings claim on the weather tab
+def cost_savings_range(store, year):
+    simulation = simulate_cost_savings(figure_cache.version, store, year)
+    if simulation is None:
+        return NO_RAINFALL
+    low, high = simulation['percentiles'][5], simulation['percentiles'][95]
+    return (f'Across {cost_model.SIMULATED_YEARS:,} simulated years of weather and demand the savings average '
+            f'${simulation["mean"]:,.0f}, with 90% of them between ${low:,.0f} and ${high:,.0f}; '
+            f'{simulation["probability_negative"]:.1%} of them cost more than before.')
+
+
+# Simulated savings of the weather based cost model for a selection (see cost_model.py),
+# per dataset version so live updates are simulated again
+@functools.lru_cache(maxsize=32)
+def simulate_cost_savings(version, store, year):
+    revenue_per_day, rainfall = monthly_cost_inputs(store, year)
+    with measure('stage', 'simulate_cost_savings'):
+        return cost_model.simulate(revenue_per_day, rainfall.reindex(revenue_per_day.index))
+
+
+@figure_cache.cached
+def update_revenue_cost_rainfall_graph(store, year):
+    adjusted_quantity, rainfall = monthly_cost_inputs(store, year)
+    rainfall_data = rainfall.to_frame()
+    months = adjusted_quantity.index.tolist()
+    operating_costs = costs_before(adjusted_quantity)
+
+    # Optimized operating costs are inversely proportional to rainfall, never below the
+    # minimum, with 10% of variability (see cost_model.py)
     np.random.seed(1)
-    random_offsets = np.random.uniform(-1, 1, size=optimized_operating_costs.shape) * variable_offset
-    optimized_operating_costs += random_offsets
-    amount_spent1 = (operating_costs.sum()) * (365/12)
-    amount_spent2 = (optimized_operating_costs.sum()) * (365/12)
-    difference_in_op_cost = amount_spent1 - amount_spent2
+    random_offsets = np.random.uniform(-1, 1, size=rainfall.shape)
+    optimized_operating_costs = costs_after(rainfall.to_numpy(), random_offsets)
+    difference_in_op_cost = annual_savings(operating_costs.to_numpy(), optimized_operating_costs)
 
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
@@ -506,7 +761,7 @@ def update_revenue_cost_rainfall_graph():
     ), secondary_y=False)
 
     fig.add_trace(go.Scatter(
-        x=list(range(1, 13)),
+        x=months,
         y=operating_costs,
         name='Operarting Costs Before (Estimate)',
         mode='lines',
@@ -521,6 +776,19 @@ def update_revenue_cost_rainfall_graph():
         line=dict(color='green')
     ), secondary_y=True)
 
+    # Operating costs in the month of next week, from the demand forecast
+    forecast = demand_forecast(figure_cache.version, store, year)
+    forecast_month = forecast.next_week_month
+    forecast_costs = costs_before(forecast.revenue_per_day(forecast.next_week()))
+    forecast_optimized = costs_after(rainfall.reindex(range(1, 13)).to_numpy())[forecast_month - 1]
+    fig.add_trace(go.Scatter(
+        x=[forecast_month, forecast_month],
+        y=[forecast_costs, forecast_optimized],
+        name=f'Operating Costs Before / After, {calendar.month_name[forecast_month]} (Forecast)',
+        mode='markers',
+        marker=dict(color=['red', 'green'], size=12, symbol='star')
+    ), secondary_y=True)
+
     # Layout updates
     fig.update_layout(
         xaxis_title='Month',
@@ -536,17 +804,52 @@ def update_revenue_cost_rainfall_graph():
     return style_graph(fig)
 
 
+@figure_cache.cached
+def update_cost_simulation_graph(store, year):
+    simulation = simulate_cost_savings(figure_cache.version, store, year)
+    fig = go.Figure()
+    if simulation is None:
+        fig.update_layout(title=NO_RAINFALL)
+        return style_graph(fig)
+    months = monthly_cost_inputs(store, year)[0].index.tolist()
+    low, median, high = cost_model.PERCENTILES
+
+    # 90% band of each simulated daily cost, then its median
+    for name, costs, color, fill in [('Before', simulation['before'], '#ff0000', 'rgba(255,0,0,0.2)'),
+                                     ('After', simulation['after'], '#00ff00', 'rgba(0,255,0,0.2)')]:
+        fig.add_trace(go.Scatter(x=months + months[::-1], y=np.concatenate([costs[high], costs[low][::-1]]),
+                                 fill='toself', fillcolor=fill, line=dict(width=0), hoverinfo='skip',
+                                 name=f'Operating Costs {name} ({high - low}% of scenarios)'))
+        fig.add_trace(go.Scatter(x=months, y=costs[median], mode='lines', line=dict(color=color),
+                                 name=f'Operating Costs {name} (median)'))
+
+    savings = simulation['percentiles']
+    fig.update_layout(
+        title=f'Savings over {cost_model.SIMULATED_YEARS:,} simulated years: ${simulation["mean"]:,.0f} on average, '
+              f'${savings[low]:,.0f} to ${savings[high]:,.0f} in {high - low}% of them',
+        xaxis_title='Month',
+        yaxis_title='Operating Cost per day ($)',
+        xaxis=dict(tickvals=list(range(1, 13)), ticktext=[calendar.month_name[i] for i in range(1, 13)]),
+    )
+    return style_graph(fig)
+
+
 # Slider tab 3 callback
-@app.callback(
+@slider_callback(
     Output('scatterplot', 'figure'),
-    [Input('month-slider', 'value')]
+    [Input('month-slider', 'value'), Input('live-version', 'data')],
+    [State('store-dropdown', 'value'), State('year-dropdown', 'value')]
 )
-def update_scatterplot(selected_month):
-    # Filter DataFrame based on the selected month
-    monthly_df = df[df['month'] == selected_month]
+def update_scatterplot_graph(selected_month, live, store, year):
+    if not affected_by_live_update(live, month=selected_month):
+        return no_update
+    return update_scatterplot(store, year, selected_month)
 
-    # Aggregate the data to find total quantity and category for each pizza flavor
-    flavor_popularity = monthly_df.groupby(['pizza_flavor', 'category'])['quantity'].sum().reset_index()
+@figure_cache.cached
+def update_scatterplot(store, year, selected_month):
+    import plotly.express as px
+    # Total quantity and category for each pizza flavor in the selected month
+    flavor_popularity = sales.select(store, year).cube.query('quantity', by=['pizza_flavor', 'category'], month=selected_month).reset_index()
 
     # Create scatter plot, color by 'category'
     scatterplot_fig = px.scatter(flavor_popularity, x='pizza_flavor', y='quantity',
@@ -563,8 +866,9 @@ def update_scatterplot(selected_month):
 
 
 # I have the pie chart to evaluate if XL and XXL are viable options
-def update_pie_chart():
-    sizes = df.groupby('size')['quantity'].sum().reset_index()
+@figure_cache.cached
+def update_pie_chart(store, year):
+    sizes = sales.select(store, year).cube.query('quantity', by='size').reset_index()
     size_order = ['S', 'M', 'L', 'XL', 'XXL']
     sizes['size'] = sizes['size'].astype('category')
     sizes['size'] = sizes['size'].cat.set_categories(size_order)
@@ -576,9 +880,9 @@ def update_pie_chart():
     return style_graph(pie_chart_fig)
 
 
-def the_greek():
-    greek_df = df[df['pizza_flavor'] == 'the_greek']
-    greek_group = greek_df.groupby('size')['quantity'].sum().reset_index()
+@figure_cache.cached
+def the_greek(store, year):
+    greek_group = sales.select(store, year).cube.query('quantity', by='size', pizza_flavor='the_greek').reset_index()
     size_order = ['S', 'M', 'L', 'XL', 'XXL']
     greek_group['size'] = greek_group['size'].astype('category')
     greek_group['size'] = greek_group['size'].cat.set_categories(size_order)
@@ -592,5 +896,88 @@ def the_greek():
 
     return(style_graph(greek_chart_fig))
 
+# Pizza pairings tab (see baskets.py)
+@figure_cache.cached
+def update_basket_lift_heatmap(store, year):
+    baskets = sales.select(store, year).baskets()
+    popular = baskets.flavor_support().nlargest(15).index.tolist() # the 15 flavors in most orders
+    lift = baskets.lift().loc[popular, popular].to_numpy(copy=True)
+    np.fill_diagonal(lift, np.nan) # a flavor with itself says nothing
+    fig = go.Figure(go.Heatmap(
+        z=lift,
+        x=popular,
+        y=popular,
+        zmid=1,
+        colorscale='RdBu',
+        colorbar={'title': 'Lift'},
+        hovertemplate='%{y} with %{x}<br>lift=%{z:.2f}<extra></extra>'
+    ))
+    fig.update_layout(title='Lift of ordering two flavors together', height=700)
+    return style_graph(fig)
+
+@figure_cache.cached
+def update_basket_rules_table(store, year):
+    baskets = sales.select(store, year).baskets()
+    rules = baskets.rules(min_support=0.001).head(15) # pairs in at least 0.1% of orders
+    fig = go.Figure(go.Table(
+        header=dict(values=['Orders with', 'also hold', 'Orders', 'Support', 'Confidence', 'Lift'], fill_color='#1E1E1E', font=dict(color='#7FDBFF')),
+        cells=dict(values=[rules['antecedent'], rules['consequent'], rules['orders'],
+                           rules['support'].map('{:.2%}'.format), rules['confidence'].map('{:.1%}'.format), rules['lift'].round(2)],
+                   fill_color='#303030', font=dict(color='#FFFFFF'))
+    ))
+    fig.update_layout(title=f'Best pairings out of {baskets.orders:,} orders')
+    return style_graph(fig)
+
+@figure_cache.cached
+def update_upsell_chart(store, year):
+    size_lift = sales.select(store, year).baskets().size_lift()
+    sizes = [size for size in ['XL', 'XXL'] if size in size_lift.columns]
+    size_lift = size_lift.drop(index='the_greek', errors='ignore')[sizes].dropna(how='all')
+    size_lift = size_lift.sort_values(sizes[0], ascending=False) if sizes else size_lift
+    fig = go.Figure([go.Bar(x=size_lift.index, y=size_lift[size], name=f'with an {size}') for size in sizes])
+    fig.add_hline(y=1, line_dash='dash', line_color='#7FDBFF')
+    fig.update_layout(title='Lift of each flavor in orders with an XL or XXL pizza', yaxis_title='Lift', barmode='group')
+    return style_graph(fig)
+
+
+if CLIENTSIDE_SLIDERS:
+    for graph, slider, store in [('heatmap-graph', 'day-slider', 'heatmap-store'),
+                                 ('employee-area-chart', 'day-slider', 'employee-store'),
+                                 ('scatterplot', 'month-slider', 'scatter-store')]:
+        app.clientside_callback(
+            ClientsideFunction(namespace='sliders', function_name='render'),
+            Output(graph, 'figure'),
+            Input(slider, 'value'),
+            State(store, 'data')
+        )
+
+startup.stage('layout_and_callbacks')
+
+# Build every slider state and static figure up front, so the first click on a tab
+# or slider is already a cache lookup
+# (for the default store and year)
+default_selection = (DEFAULT_STORE, DEFAULT_YEAR)
+warm_thread = None
+if not LAZY_TABS:
+    warm_thread = figure_cache.warm(
+        [(update_heatmap, *default_selection, day) for day in day_order]
+        + [(generate_employee_area_chart, *default_selection, day) for day in day_order]
+        + [(update_scatterplot, *default_selection, int(month)) for month in sales.select(*default_selection).cube.values('month')]
+        + [(function, *default_selection) for function in [update_pie_chart, the_greek, update_subplot_graph, update_revenue_cost_rainfall_graph, update_cost_simulation_graph,
+                                                             update_basket_lift_heatmap, update_basket_rules_table, update_upsell_chart]]
+    )
+
+# Timings of every callback, figure build and data stage at /metrics (see metrics.py)
+metrics.register_routes(server, {output: callback['callback'].__name__ for output, callback in app.callback_map.items() if 'callback' in callback})
+
+# Typed arrays, gzip and ETags for every response (see payloads.py). Registered after the
+# metrics, so they run before them and /metrics counts the bytes actually sent
+if COMPACT_RESPONSES:
+    payloads.register_routes(server)
+startup.stage('warm_up')
+
 if __name__ == '__main__':
+    # a single process, it clears the figures of earlier runs itself (see gunicorn.conf.py)
+    figure_cache.prune()
+    print(startup.report())
     app.run_server()
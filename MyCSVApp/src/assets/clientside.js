@@ -0,0 +1,20 @@
+// Clientside slider callbacks, used when the app runs with CLIENTSIDE_SLIDERS=1.
+// The store holds a shared layout plus, per slider value, the traces and the
+// layout keys that differ (see slider_store in app.py).
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    sliders: {
+        render: function(value, store) {
+            if (!store) {
+                return window.dash_clientside.no_update;
+            }
+            var state = store.states[String(value)];
+            if (!state) {
+                return window.dash_clientside.no_update;
+            }
+            return {
+                data: state.data,
+                layout: Object.assign({}, store.layout, state.layout)
+            };
+        }
+    }
+});
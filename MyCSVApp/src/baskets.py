@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+# Market basket analysis. Order lines are grouped into orders by a compact integer key,
+# and each order becomes a row of a sparse 0/1 order x flavor (and order x size) matrix.
+# Every co-purchase count is then one sparse product, e.g. flavors.T @ flavors holds how
+# many orders contain both flavors of each pair, and the number of orders holding each
+# flavor on its diagonal. Counts of disjoint sets of orders (other stores or years) add up.
+
+
+# Sparse 0/1 matrix with a row per order and a column per category of `items`
+def incidence(orders, n_orders, items):
+    import scipy.sparse as sparse
+    codes = items.codes.astype(np.int32)
+    known = codes >= 0
+    matrix = sparse.csr_matrix((np.ones(known.sum(), dtype=np.int32), (orders[known], codes[known])),
+                               shape=(n_orders, len(items.categories)))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1  # a flavor ordered twice in one order counts once
+    return matrix
+
+
+class BasketCounts:
+    def __init__(self, orders, flavor_pairs, flavor_sizes, sizes):
+        self.orders = orders                # number of orders
+        self.flavor_pairs = flavor_pairs    # [flavor x flavor] orders holding both
+        self.flavor_sizes = flavor_sizes    # [flavor x size] orders holding the flavor and a pizza of that size
+        self.sizes = sizes                  # orders holding a pizza of each size
+
+    # From parallel order id, flavor and size columns (the last two categorical)
+    @classmethod
+    def from_lines(cls, order_id, flavor, size):
+        orders, keys = pd.factorize(np.asarray(order_id))
+        orders = orders.astype(np.int32)
+        flavor = pd.Categorical(flavor)
+        size = pd.Categorical(size)
+        by_flavor = incidence(orders, len(keys), flavor)
+        by_size = incidence(orders, len(keys), size)
+        flavors, sizes = flavor.categories.astype(str), size.categories.astype(str)
+        return cls(
+            len(keys),
+            pd.DataFrame((by_flavor.T @ by_flavor).toarray(), index=flavors, columns=flavors),
+            pd.DataFrame((by_flavor.T @ by_size).toarray(), index=flavors, columns=sizes),
+            pd.Series(np.asarray(by_size.sum(axis=0)).ravel(), index=sizes),
+        )
+
+    @classmethod
+    def merge(cls, counts):
+        counts = list(counts)
+        if len(counts) == 1:
+            return counts[0]
+        flavors = sorted(set().union(*(c.flavor_pairs.index for c in counts)))
+        sizes = sorted(set().union(*(c.sizes.index for c in counts)))
+        return cls(
+            sum(c.orders for c in counts),
+            sum(c.flavor_pairs.reindex(index=flavors, columns=flavors, fill_value=0) for c in counts),
+            sum(c.flavor_sizes.reindex(index=flavors, columns=sizes, fill_value=0) for c in counts),
+            sum(c.sizes.reindex(sizes, fill_value=0) for c in counts),
+        )
+
+    # All the counts as one long frame (table, row, column, orders), for the data cache
+    def to_frame(self):
+        tables = [
+            ('pairs', self.flavor_pairs.stack()),
+            ('flavor_sizes', self.flavor_sizes.stack()),
+            ('sizes', self.sizes.rename_axis('row').to_frame().assign(column='').set_index('column', append=True).iloc[:, 0]),
+            ('orders', pd.Series([self.orders], index=pd.MultiIndex.from_tuples([('', '')]))),
+        ]
+        frames = [counts.rename_axis(['row', 'column']).rename('orders').reset_index().assign(table=table) for table, counts in tables]
+        return pd.concat(frames, ignore_index=True)[['table', 'row', 'column', 'orders']]
+
+    @classmethod
+    def from_frame(cls, frame):
+        tables = {table: rows for table, rows in frame.groupby('table', observed=True)}
+        def square(rows):
+            return rows.pivot(index='row', columns='column', values='orders').rename_axis(index=None, columns=None)
+        flavor_pairs = square(tables['pairs'])
+        return cls(
+            int(tables['orders']['orders'].iloc[0]),
+            flavor_pairs.reindex(columns=flavor_pairs.index),
+            square(tables['flavor_sizes']),
+            tables['sizes'].set_index('row')['orders'].rename_axis(None).rename(None),
+        )
+
+    # Share of orders holding each flavor
+    def flavor_support(self):
+        return pd.Series(np.diag(self.flavor_pairs), index=self.flavor_pairs.index) / self.orders
+
+    # How much more often two flavors are ordered together than if they were independent
+    def lift(self):
+        support = self.flavor_support().to_numpy()
+        pairs = self.flavor_pairs.to_numpy() / self.orders
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lift = pairs / np.outer(support, support)
+        return pd.DataFrame(lift, index=self.flavor_pairs.index, columns=self.flavor_pairs.columns)
+
+    # Every "orders with A also hold B" rule between two flavors, with its support (share of
+    # orders with both), confidence (share of A's orders with B) and lift, best lift first
+    def rules(self, min_support=0.0):
+        counts = self.flavor_pairs.to_numpy()
+        with_a = np.diag(counts)
+        a, b = np.nonzero(counts)
+        keep = (a != b) & (counts[a, b] / self.orders >= min_support)
+        a, b = a[keep], b[keep]
+        flavors = self.flavor_pairs.index
+        rules = pd.DataFrame({
+            'antecedent': flavors[a],
+            'consequent': flavors[b],
+            'orders': counts[a, b],
+            'support': counts[a, b] / self.orders,
+            'confidence': counts[a, b] / with_a[a],
+            'lift': counts[a, b] * self.orders / (with_a[a] * with_a[b]),
+        })
+        return rules.sort_values(['lift', 'orders'], ascending=False, ignore_index=True)
+
+    # [flavor x size] lift of each flavor with orders that hold a pizza of each size: above
+    # 1, the flavor is ordered next to that size (e.g. an XL the_greek) more than on average
+    def size_lift(self):
+        flavor_orders = np.diag(self.flavor_pairs)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lift = self.flavor_sizes.to_numpy() * self.orders / np.outer(flavor_orders, self.sizes.to_numpy())
+        return pd.DataFrame(lift, index=self.flavor_sizes.index, columns=self.flavor_sizes.columns)
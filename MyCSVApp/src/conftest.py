@@ -0,0 +1,27 @@
+import os
+import pathlib
+import sys
+import tempfile
+
+import pytest
+
+# the app's modules import each other by name, as when app.py runs from src
+SRC = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(SRC))
+sys.path.insert(0, str(SRC.parent.joinpath('benchmarks')))
+# caches (prepared frames, cubes, SQLite databases) go to a scratch directory, not src/.cache
+os.environ['SALES_CACHE_DIR'] = tempfile.mkdtemp(prefix='sales-cache-')
+
+
+# A small synthetic data folder (SQL_output.csv, the four source tables and the rainfall)
+@pytest.fixture(scope='session')
+def sales_dir(tmp_path_factory):
+    import synthetic
+    return synthetic.generate(20_000, tmp_path_factory.mktemp('sales'), seed=1, tables=True)
+
+
+# The prepared order lines of sales_dir
+@pytest.fixture(scope='session')
+def sales(sales_dir):
+    from prepare import prepare_sales, read_sales
+    return prepare_sales(read_sales(sales_dir.joinpath('SQL_output.csv')))
@@ -0,0 +1,61 @@
+import numpy as np
+
+# The weather based operating cost model of the "weather affects demand" tab. Every
+# function works on arrays whose last axis is the month, so one call prices a single
+# year or a whole [trajectories, months] batch of simulated ones.
+COST_PER_REVENUE = .4
+FIXED_COST = 500 # Adjust based on realistic business costs
+BASE_COST_MULTIPLIER = 250
+MIN_OPERATING_COST = 1200 # Adjust based on realistic business costs
+OFFSET_PERCENTAGE = 0.1
+DAYS_PER_MONTH = 365 / 12
+
+SIMULATED_YEARS = 100_000
+PERCENTILES = [5, 50, 95]
+
+
+# Daily operating costs before the changes, from the revenue per day of each month
+def costs_before(revenue_per_day):
+    return (revenue_per_day * COST_PER_REVENUE) + FIXED_COST
+
+
+# Daily operating costs after the changes: inversely proportional to the month's rainfall
+# relative to the rainiest month, never below the minimum, plus `offsets` (-1..1) of 10%
+# variability
+def costs_after(rainfall, offsets=0):
+    normalized_rainfall = rainfall / np.max(rainfall, axis=-1, keepdims=True)
+    costs = (BASE_COST_MULTIPLIER * (1 - normalized_rainfall)) + MIN_OPERATING_COST
+    costs = np.maximum(costs, MIN_OPERATING_COST)
+    return costs + offsets * (costs * OFFSET_PERCENTAGE)
+
+
+def annual_savings(before, after):
+    return (np.sum(before, axis=-1) - np.sum(after, axis=-1)) * DAYS_PER_MONTH
+
+
+# Draws `years` scenarios of monthly rainfall and demand around the observed ones, in one
+# batch: both are scaled by lognormal noise with mean 1 (rain_sigma, demand_sigma), and
+# each month gets its own uniform cost offset. Returns the annual savings of every
+# scenario, their mean, percentiles and the probability that the changes cost money,
+# and the percentiles of the daily costs before and after for each month. None when a
+# month has no rainfall (NaN), the model has nothing to price it with
+def simulate(revenue_per_day, rainfall, years=SIMULATED_YEARS, rain_sigma=0.5, demand_sigma=0.1, seed=1):
+    revenue_per_day = np.asarray(revenue_per_day, dtype=float)
+    rainfall = np.asarray(rainfall, dtype=float)
+    if np.isnan(rainfall).any():
+        return None
+    rng = np.random.default_rng(seed)
+    shape = (years, len(rainfall))
+    rain = rainfall * rng.lognormal(-rain_sigma ** 2 / 2, rain_sigma, shape)
+    demand = revenue_per_day * rng.lognormal(-demand_sigma ** 2 / 2, demand_sigma, shape)
+    before = costs_before(demand)
+    after = costs_after(rain, rng.uniform(-1, 1, shape))
+    savings = annual_savings(before, after)
+    return {
+        'savings': savings,
+        'mean': savings.mean(),
+        'percentiles': dict(zip(PERCENTILES, np.percentile(savings, PERCENTILES))),
+        'probability_negative': (savings < 0).mean(),
+        'before': dict(zip(PERCENTILES, np.percentile(before, PERCENTILES, axis=0))),
+        'after': dict(zip(PERCENTILES, np.percentile(after, PERCENTILES, axis=0))),
+    }
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from data_cache import CACHE_DIR, load_cached
+from metrics import add_rows
+
+# The dashboard only ever slices sales along these columns, so every figure can be
+# answered from the per-cell totals instead of the order lines
+CUBE_DIMENSIONS = ['month', 'day_of_week', 'hour', 'pizza_flavor', 'size', 'category']
+
+# quantity: pizzas sold, price: revenue (sum of line prices), lines: order lines,
+# orders: distinct orders in the cell. lines, quantity and price add up across any
+# cells; orders only add up across month, day_of_week and hour since one order can
+# hold several flavors and sizes
+CUBE_MEASURES = ['quantity', 'price', 'lines', 'orders']
+# the dimensions a query has to keep for its 'orders' to be distinct orders
+ORDER_DIMENSIONS = ['pizza_flavor', 'size', 'category']
+
+
+def build_cube(df):
+    grouped = df.groupby(CUBE_DIMENSIONS, observed=True)
+    cells = grouped.agg(
+        quantity=('quantity', 'sum'),
+        price=('price', 'sum'),
+        lines=('order_id', 'size'),
+        orders=('order_id', 'nunique'),
+    )
+    return cells.reset_index()
+
+
+class SalesCube:
+    def __init__(self, cells):
+        self.cells = cells
+
+    # Totals of `measures` grouped by `by`, for the cells matching every filter.
+    # A filter value can be a single value or a list of accepted values, e.g.
+    # cube.query('quantity', by='hour', day_of_week='Monday')
+    # Summing 'orders' over flavors or sizes would count an order once per pizza it holds,
+    # so it can only be asked for grouped by all of ORDER_DIMENSIONS (the SQL backend
+    # counts distinct orders for any grouping)
+    def query(self, measures, by=(), **filters):
+        cells = self.cells
+        if 'orders' in ([measures] if isinstance(measures, str) else measures):
+            grouped = [by] if isinstance(by, str) else by
+            missing = [dimension for dimension in ORDER_DIMENSIONS if dimension not in grouped]
+            if missing:
+                raise ValueError(f"'orders' doesn't add up across {', '.join(missing)}, group by them too")
+        add_rows(len(cells))
+        if filters:
+            mask = np.ones(len(cells), dtype=bool)
+            for column, value in filters.items():
+                if isinstance(value, (list, tuple, set)):
+                    mask &= cells[column].isin(value).to_numpy()
+                else:
+                    mask &= (cells[column] == value).to_numpy()
+            cells = cells[mask]
+        if not by:
+            return cells[measures].sum()
+        return cells.groupby(by, observed=True)[measures].sum()
+
+    # Folds the cells built from new order lines into the cube. The merged cells replace
+    # self.cells in one assignment, so queries running meanwhile see the old or the new cube.
+    # Distinct orders are added per cell, assuming an order's lines arrive together
+    def add(self, df):
+        self.cells = combine_cells([self.cells, build_cube(df)])
+
+    # Distinct values of one dimension, in sorted order
+    def values(self, dimension):
+        return sorted(self.cells[dimension].unique())
+
+
+# Adds up the cells of several cubes (e.g. of different stores or years) per cell
+def combine_cells(cells):
+    cells = pd.concat(cells, ignore_index=True)
+    cells = cells.groupby(CUBE_DIMENSIONS, observed=True, as_index=False)[CUBE_MEASURES].sum()
+    for dimension in CUBE_DIMENSIONS:
+        # concat falls back to object when the cubes have different categories
+        if cells[dimension].dtype == object:
+            cells[dimension] = cells[dimension].astype('category')
+    return cells
+
+
+def load_sales_cube(df, version, directory=CACHE_DIR):
+    return SalesCube(load_cached('cube', version, lambda: build_cube(df), directory))
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from prepare import prepare_sales, read_sales
+
+# On-disk cache of the prepared sales frame. Every column is written as its own
+# .npy file so gunicorn workers can memory-map them instead of re-running
+# prepare_sales on boot; all workers then share the same pages from the OS page cache.
+# Bump CACHE_FORMAT whenever prepare_sales changes what it produces.
+CACHE_FORMAT = 3
+CACHE_DIR = pathlib.Path(os.environ.get('SALES_CACHE_DIR', pathlib.Path(__file__).parent.joinpath('.cache')))
+
+
+# sha256 of a file, remembered by (size, mtime) so a warm boot doesn't re-read the CSV
+def file_digest(path):
+    path = pathlib.Path(path).resolve()
+    stat = path.stat()
+    index_path = CACHE_DIR.joinpath('digests.json')
+    try:
+        index = json.loads(index_path.read_text())
+    except (OSError, ValueError):
+        index = {}
+    known = index.get(str(path))
+    if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+        return known['sha256']
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    index[str(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha.hexdigest()}
+    atomic_write_text(index_path, json.dumps(index))
+    return sha.hexdigest()
+
+
+def dataset_version(*paths):
+    sha = hashlib.sha256(f'format={CACHE_FORMAT}'.encode())
+    for path in paths:
+        sha.update(file_digest(path).encode())
+    return sha.hexdigest()[:16]
+
+
+def atomic_write_text(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def write_frame(df, target):
+    # Build in a scratch directory and rename it into place, so a worker booting
+    # at the same time never sees a half written cache
+    target.parent.mkdir(parents=True, exist_ok=True)
+    scratch = pathlib.Path(tempfile.mkdtemp(dir=target.parent, prefix='.build-'))
+    columns = []
+    for i, name in enumerate(df.columns):
+        values = df[name]
+        column = {'name': name, 'file': f'col_{i:04d}.npy'}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            column['categories'] = values.cat.categories.tolist()
+            column['ordered'] = bool(values.cat.ordered)
+            values = values.cat.codes
+        values = values.to_numpy()
+        if values.dtype == object:
+            # strings are stored as integer codes plus their distinct values
+            codes, uniques = pd.factorize(values)
+            values = codes.astype(np.int32)
+            column['values'] = uniques.tolist()
+        np.save(scratch.joinpath(column['file']), values, allow_pickle=False)
+        columns.append(column)
+    scratch.joinpath('meta.json').write_text(json.dumps({'rows': len(df), 'columns': columns}))
+    try:
+        os.rename(scratch, target)
+    except OSError:
+        # another worker finished first, keep theirs
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def read_frame(target):
+    meta = json.loads(target.joinpath('meta.json').read_text())
+    data = {}
+    for column in meta['columns']:
+        values = np.asarray(np.load(target.joinpath(column['file']), mmap_mode='r'))
+        if 'categories' in column:
+            values = pd.Categorical.from_codes(values, categories=column['categories'], ordered=column['ordered'])
+        elif 'values' in column:
+            uniques = np.array(column['values'] + [np.nan], dtype=object)
+            values = uniques[values]  # code -1 (missing) picks the trailing nan
+        data[column['name']] = values
+    # copy=False keeps numeric columns and categorical codes as views on the memory-mapped files
+    return pd.DataFrame(data, copy=False)
+
+
+# Returns the frame cached as <kind>-<version> in `directory`, building it with build()
+# on a miss
+def load_cached(kind, version, build, directory=CACHE_DIR):
+    target = pathlib.Path(directory).joinpath(f'{kind}-{version}')
+    if not is_cached(kind, version, directory):
+        write_frame(build(), target)
+        # drop caches built from older inputs
+        for old in target.parent.glob(f'{kind}-*'):
+            if old != target:
+                shutil.rmtree(old, ignore_errors=True)
+    return read_frame(target)
+
+
+def is_cached(kind, version, directory=CACHE_DIR):
+    return pathlib.Path(directory).joinpath(f'{kind}-{version}', 'meta.json').exists()
+
+
+# Returns the prepared sales frame and the dataset version it was built from
+def load_prepared_sales(csv_path, directory=CACHE_DIR):
+    version = dataset_version(csv_path)
+    return load_cached('sales', version, lambda: prepare_sales(read_sales(csv_path)), directory), version
@@ -0,0 +1,100 @@
+import functools
+import hashlib
+import json
+import pathlib
+import shutil
+import threading
+
+import plotly.io as pio
+
+from data_cache import CACHE_DIR, atomic_write_text
+from metrics import measure
+
+
+# Hash of every module in src. Figures are built from code spread over several modules
+# (cube.py, cost_model.py, payloads.py, ...), so a deploy that changes any of them
+# starts a fresh set of figures
+def code_version(directory=pathlib.Path(__file__).parent):
+    sha = hashlib.sha1()
+    for path in sorted(pathlib.Path(directory).glob('*.py')):
+        sha.update(path.name.encode())
+        sha.update(path.read_bytes())
+    return sha.hexdigest()[:8]
+
+
+# Figures keyed by (builder, arguments, dataset version), kept as JSON files under
+# the data cache directory so every gunicorn worker on the host shares them. Each
+# process also keeps the figures it has already read in memory. `encode`, if given,
+# rewrites each built figure dict before it's cached (e.g. payloads.pack_figure).
+class FigureCache:
+    def __init__(self, version, directory=CACHE_DIR, encode=None):
+        self.root = pathlib.Path(directory)
+        self.encode = encode
+        self.code = code_version()
+        # the figure directories this process has written to
+        self.written = set()
+        # plotly figure construction isn't thread safe, builds from the warm-up thread
+        # and from requests take turns
+        self.build_lock = threading.Lock()
+        self.set_version(version)
+
+    def set_version(self, version):
+        self.version = version
+        self.directory = self.root.joinpath(f'figures-{version}-{self.code}' + (f'-{self.encode.__name__}' if self.encode else ''))
+        self.memory = {}
+        # figures this process built from another dataset version can never be asked for
+        # again. Directories of other processes are left alone, they may still be on the
+        # version, or the code, they were built for
+        for old in self.written - {self.directory}:
+            shutil.rmtree(old, ignore_errors=True)
+        self.written &= {self.directory}
+
+    # Removes the figures of every other dataset version and code version, e.g. those left
+    # by earlier runs or deploys. Run once per start, in one process (see gunicorn.conf.py)
+    def prune(self):
+        for old in self.root.glob('figures-*'):
+            if old != self.directory:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def path(self, name, args):
+        key = hashlib.sha1(json.dumps([name, args], default=str).encode()).hexdigest()[:16]
+        return self.directory.joinpath(f'{name}-{key}.json')
+
+    def get(self, builder, name, args):
+        path = self.path(name, args)
+        figure = self.memory.get(path)
+        if figure is not None:
+            return figure
+        try:
+            figure = json.loads(path.read_text())
+        except (OSError, ValueError):
+            with self.build_lock, measure('figure', builder.__name__) as measurement:
+                figure = json.loads(pio.to_json(builder(*args), validate=False))
+                if self.encode:
+                    figure = self.encode(figure)
+                text = json.dumps(figure)
+                measurement.payload_bytes = len(text)
+            atomic_write_text(path, text)
+            self.written.add(path.parent)
+        self.memory[path] = figure
+        return figure
+
+    # Decorator: the builder's result is cached and returned as a plain figure dict,
+    # which dcc.Graph accepts as is. The code version is part of the directory, so a
+    # deploy that changes the figures doesn't serve stale ones.
+    def cached(self, builder):
+        name = builder.__name__
+
+        @functools.wraps(builder)
+        def wrapper(*args):
+            return self.get(builder, name, list(args))
+        return wrapper
+
+    # Builds every (cached builder, arguments) pair in calls in a background thread
+    def warm(self, calls):
+        def run():
+            for function, *args in calls:
+                function(*args)
+        thread = threading.Thread(target=run, name='figure-cache-warm', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from prepare import day_order
+
+# Demand forecasts for every pizza_flavor x weekday x hour series at once. Each series is
+# observed once per month, as its average quantity on that weekday of the month, and all
+# series share the same regressors: an intercept, yearly seasonality (sine and cosine of
+# the month) and the month's rainfall. So a single ridge regression solve fits them all:
+#   coefficients = (X'X + ridge I)^-1 X'Y,  X: [months x regressors], Y: [months x series]
+RIDGE = 1e-3
+
+
+# Regressors for each month: intercept, seasonality and (if given) rainfall
+def features(months, rainfall=None):
+    months = np.asarray(months, dtype=float)
+    angle = 2 * np.pi * months / 12
+    columns = [np.ones_like(months), np.sin(angle), np.cos(angle)]
+    if rainfall is not None:
+        columns.append(np.asarray(rainfall, dtype=float))
+    return np.column_stack(columns)
+
+
+class DemandForecast:
+    # cube, calendar and rain of a partitions.Selection
+    def __init__(self, cube, calendar, rain, ridge=RIDGE):
+        quantity = cube.query('quantity', by=['month', 'pizza_flavor', 'day_of_week', 'hour'])
+        levels = [quantity.index.get_level_values(i) for i in range(4)]
+        self.flavors = pd.Index(sorted(levels[1].astype(str).unique()), name='pizza_flavor')
+
+        # [month, flavor, weekday, hour] totals, then per day of that weekday in that month
+        totals = np.zeros((12, len(self.flavors), len(day_order), 24))
+        totals[np.asarray(levels[0], dtype=int) - 1,
+               self.flavors.get_indexer(levels[1].astype(str)),
+               pd.Index(day_order).get_indexer(levels[2].astype(str)),
+               np.asarray(levels[3], dtype=int)] = quantity.to_numpy()
+        weekdays = calendar.weekdays_per_month.to_numpy()
+        observed = weekdays.sum(axis=1) > 0  # months the sales cover
+        self.months = np.flatnonzero(observed) + 1
+        per_day = totals[observed] / np.maximum(weekdays[observed], 1)[:, None, :, None]
+
+        # rainfall is left out when some month has none
+        self.rain = rain['rainfall'].reindex(range(1, 13))
+        self.use_rain = not self.rain.isna().any()
+        x = features(self.months, self.rain[self.months] if self.use_rain else None)
+        y = per_day.reshape(len(self.months), -1)
+        self.coefficients = np.linalg.solve(x.T @ x + ridge * np.eye(x.shape[1]), x.T @ y)
+
+        prices = cube.query(['price', 'quantity'], by='pizza_flavor')
+        prices.index = prices.index.astype(str)
+        prices = prices.reindex(self.flavors)
+        self.revenue_per_pizza = (prices['price'] / prices['quantity']).fillna(0).to_numpy()
+        self.next_week_month = (calendar.last_date + pd.Timedelta(days=1)).month
+
+    # Expected quantity per day, [flavor, weekday, hour], in `month`. `rainfall` defaults to
+    # the month's rainfall in the data, pass a weather forecast instead to use one
+    def predict(self, month, rainfall=None):
+        rainfall = self.rain[month] if rainfall is None else rainfall
+        x = features([month], [rainfall] if self.use_rain else None)
+        demand = np.clip(x @ self.coefficients, 0, None)
+        return demand.reshape(len(self.flavors), len(day_order), 24)
+
+    # Forecast for the week after the last date in the data
+    def next_week(self, rainfall=None):
+        return self.predict(self.next_week_month, rainfall)
+
+    # Average revenue per day over a week of a forecast
+    def revenue_per_day(self, demand):
+        return (demand.sum(axis=(1, 2)) * self.revenue_per_pizza).sum() / len(day_order)
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
+
+from cube import CUBE_DIMENSIONS
+
+# Ingredients belong to a flavor, not to an order line, so they're kept as a sparse
+# flavor x ingredient incidence matrix. Ingredient demand along any cube dimension is
+# then one product: [values x flavors] quantities times [flavors x ingredients].
+
+
+# Distinct (pizza_flavor, ingredient) pairs, from parallel arrays of flavors and their
+# comma separated ingredient lists
+def ingredient_pairs(flavors, ingredient_lists):
+    rows = pd.DataFrame({'pizza_flavor': np.asarray(flavors, dtype=object), 'ingredient': np.asarray(ingredient_lists, dtype=object)})
+    rows = rows.dropna().drop_duplicates()
+    # Fixing typing errors in the lists: one or two spaces after the commas
+    rows['ingredient'] = rows['ingredient'].str.split(',')
+    rows = rows.explode('ingredient')
+    rows['ingredient'] = rows['ingredient'].str.strip()
+    rows = rows[rows['ingredient'] != ''].drop_duplicates()
+    return rows.astype('category').reset_index(drop=True)
+
+
+# Pairs of the flavors and ingredient lists in a prepared sales frame, read from the
+# distinct (flavor, ingredients) codes rather than from every line
+def sales_ingredient_pairs(df):
+    flavors, ingredients = df['pizza_flavor'].cat, df['ingredients'].cat
+    codes = pd.DataFrame({'flavor': flavors.codes, 'ingredients': ingredients.codes}).drop_duplicates()
+    codes = codes[(codes['flavor'] >= 0) & (codes['ingredients'] >= 0)]
+    return ingredient_pairs(flavors.categories[codes['flavor']], ingredients.categories[codes['ingredients']])
+
+
+class IngredientMatrix:
+    def __init__(self, pairs):
+        import scipy.sparse as sparse
+        pairs = pairs.drop_duplicates()
+        self.flavors = pd.Index(sorted(pairs['pizza_flavor'].astype(str).unique()), name='pizza_flavor')
+        self.ingredients = pd.Index(sorted(pairs['ingredient'].astype(str).unique()), name='ingredient')
+        rows = self.flavors.get_indexer(pairs['pizza_flavor'].astype(str))
+        columns = self.ingredients.get_indexer(pairs['ingredient'].astype(str))
+        self.matrix = sparse.csr_matrix((np.ones(len(pairs)), (rows, columns)), shape=(len(self.flavors), len(self.ingredients)))
+
+    # Pizzas that use each ingredient, grouped by `by` (any cube dimension) for the cells
+    # matching the filters, e.g. matrix.rollup(cube, 'hour', day_of_week='Friday')
+    def rollup(self, cube, by='hour', **filters):
+        quantity = cube.query('quantity', by=[by, 'pizza_flavor'], **filters)
+        quantity = quantity.unstack('pizza_flavor', fill_value=0)
+        quantity.columns = quantity.columns.astype(str)
+        quantity = quantity.reindex(columns=self.flavors, fill_value=0)
+        # [ingredients x flavors] @ [flavors x values], the sparse side on the left
+        demand = (self.matrix.T @ quantity.to_numpy(dtype=float).T).T
+        return pd.DataFrame(demand, index=quantity.index, columns=self.ingredients)
+
+
+# GET /api/ingredients?by=hour&day_of_week=Friday&store=all&year=2015 returns the pizzas
+# made with each ingredient per value of `by`, for the cells matching the other cube
+# dimensions given, with the number of days and of each weekday the totals cover
+def register_routes(server, sales):
+    @server.route('/api/ingredients')
+    def ingredient_rollup():
+        args = request.args.to_dict()
+        store = args.pop('store', 'all')
+        year = args.pop('year', sales.years[-1])
+        by = args.pop('by', 'hour')
+        try:
+            year = year if year == 'all' else int(year)
+            if by not in CUBE_DIMENSIONS or by == 'pizza_flavor' or set(args) - set(CUBE_DIMENSIONS):
+                raise ValueError(f'by and filters must be cube dimensions ({", ".join(CUBE_DIMENSIONS)}), by not pizza_flavor')
+            filters = {column: int(value) if value.isdigit() else value for column, value in args.items()}
+            selection = sales.select(store, year)
+            demand = selection.ingredients.rollup(selection.cube, by, **filters)
+        except (KeyError, ValueError) as error:
+            return jsonify({'error': str(error)}), 400
+        return jsonify({
+            'by': by,
+            'index': [str(value) for value in demand.index],
+            'ingredients': demand.columns.tolist(),
+            'data': demand.to_numpy().tolist(),
+            'days': int(selection.calendar.days_per_month.sum()),
+            'weekdays': selection.calendar.weekdays.astype(int).to_dict(),
+        })
@@ -0,0 +1,180 @@
+import concurrent.futures
+import multiprocessing
+import os
+import pathlib
+import pickle
+import tempfile
+import threading
+import time
+import traceback
+from contextvars import copy_context
+
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from dash.exceptions import PreventUpdate
+from dash.long_callback._proxy_set_props import ProxySetProps
+from dash.long_callback.managers import BaseLongCallbackManager
+
+import metrics
+from data_cache import CACHE_DIR
+
+# Background callbacks without a broker: a Dash callback manager that runs jobs in a local
+# process pool (forked from the gunicorn worker, so the children already have the sales
+# loaded) and keeps their progress and results as files under CACHE_DIR/jobs, where
+# every worker on the host sees them. The browser polls whichever worker it reaches.
+#
+# A job is keyed by its callback, arguments and dataset version, and identical requests
+# share one job: the first creates <key>.job with the pid of the worker running it, later
+# ones just poll for <key>.result. Results are kept for JOB_RESULT_SECONDS.
+#
+# Progress is the data stage or figure the job is on (see metrics.measure), so the
+# callbacks keep their signatures and run the same inline or as jobs.
+JOB_PROCESSES = int(os.environ.get('JOB_PROCESSES', 2))
+JOB_RESULT_SECONDS = int(os.environ.get('JOB_RESULT_SECONDS', 600))
+JOBS_DIR = CACHE_DIR.joinpath('jobs')
+
+# the manager of this process, for run_job to find the callbacks in the pool children
+manager = None
+
+
+class LocalJobManager(BaseLongCallbackManager):
+    # version() returns the dataset version, part of every job key. after_fork runs in
+    # every pool child, e.g. to replace locks a thread of the parent held when it forked
+    def __init__(self, version, after_fork=None, processes=JOB_PROCESSES, directory=JOBS_DIR):
+        global manager
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.after_fork = after_fork
+        self.processes = processes
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        self.callbacks = {}
+        manager = self
+        super().__init__(cache_by=[version])
+
+    def path(self, key, kind):
+        return self.directory.joinpath(f'{key}.{kind}')
+
+    def make_job_fn(self, fn, progress, key=None):
+        self.callbacks[key] = fn
+        return key
+
+    def call_job_fn(self, key, job_fn, args, context):
+        self.expire()
+        if self.result_ready(key) or self.job_running(key):
+            return key
+        # left by a worker that died
+        self.path(key, 'job').unlink(missing_ok=True)
+        try:
+            fd = os.open(self.path(key, 'job'), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return key  # another request started it meanwhile
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = concurrent.futures.ProcessPoolExecutor(
+                    self.processes, mp_context=multiprocessing.get_context('fork'), initializer=self.after_fork)
+            future = self.pool.submit(run_job, job_fn, key, args, dict(context))
+        future.add_done_callback(lambda future: self.job_done(key, future))
+        return key
+
+    # A child that died (and broke the pool with it) fails its job rather than leave it running
+    def job_done(self, key, future):
+        error = future.exception()
+        if error is not None:
+            self.write(key, 'result', {'long_callback_error': {'msg': str(error), 'tb': ''}})
+            if isinstance(error, concurrent.futures.process.BrokenProcessPool):
+                with self.pool_lock:
+                    self.pool = None
+
+    # Running while its worker is alive and the result isn't there yet
+    def job_running(self, job):
+        if not job or self.result_ready(job):
+            return False
+        try:
+            pid = int(self.path(job, 'job').read_text())
+            os.kill(pid, 0)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    # Jobs are shared by identical requests, so one a page no longer waits for runs on
+    # for the others and its result is kept
+    def terminate_job(self, job):
+        pass
+
+    def terminate_unhealthy_job(self, job):
+        return False
+
+    def get_progress(self, key):
+        try:
+            return [self.path(key, 'progress').read_text()]
+        except OSError:
+            return None
+
+    def result_ready(self, key):
+        return self.path(key, 'result').exists()
+
+    def get_result(self, key, job):
+        try:
+            return pickle.loads(self.path(key, 'result').read_bytes())
+        except OSError:
+            return self.UNDEFINED
+
+    def get_updated_props(self, key):
+        try:
+            return pickle.loads(self.path(key, 'props').read_bytes())
+        except OSError:
+            return {}
+
+    def clear_cache_entry(self, key):
+        for kind in ['job', 'progress', 'result', 'props']:
+            self.path(key, kind).unlink(missing_ok=True)
+
+    # Drops results older than JOB_RESULT_SECONDS
+    def expire(self):
+        cutoff = time.time() - JOB_RESULT_SECONDS
+        for path in self.directory.glob('*.result'):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    self.clear_cache_entry(path.stem)
+            except OSError:
+                pass
+
+    def write(self, key, kind, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(value if isinstance(value, bytes) else pickle.dumps(value))
+        os.replace(tmp, self.path(key, kind))
+
+
+# Runs in a pool child: calls the callback with the request's context and stores what it
+# returns (or raised) where the polling requests look for it
+def run_job(callback_key, key, args, context):
+    def report(measurement):
+        manager.write(key, 'progress', f'Working on {measurement.name}…'.encode())
+
+    def set_props(component_id, props):
+        manager.write(key, 'props', {component_id: props})
+
+    def run():
+        callback_context = AttributeDict(**context)
+        callback_context.ignore_register_page = False
+        callback_context.updated_props = ProxySetProps(set_props)
+        context_value.set(callback_context)
+        fn = manager.callbacks[callback_key]
+        metrics.listeners.append(report)
+        try:
+            result = fn(**args) if isinstance(args, dict) else fn(*args)
+        except PreventUpdate:
+            result = {'_dash_no_update': '_dash_no_update'}
+        except Exception as error:
+            result = {'long_callback_error': {'msg': str(error), 'tb': traceback.format_exc()}}
+        finally:
+            metrics.listeners.remove(report)
+        manager.write(key, 'progress', b'')
+        manager.write(key, 'result', result)
+
+    copy_context().run(run)
+
@@ -0,0 +1,144 @@
+import hashlib
+import hmac
+import io
+import logging
+import os
+import pathlib
+import threading
+import time
+
+import numpy as np
+from flask import jsonify, request
+
+from data_cache import atomic_write_text
+from prepare import prepare_sales, read_sales
+
+# Live sales: new order lines are dropped as SQL_output.csv-shaped CSV files into the
+# incoming directory (directly, or through POST /api/orders). Every worker polls that
+# directory, prepares only the new files and folds them into its partition's cube and
+# basket counts, so nothing is recomputed for the orders already loaded.
+LIVE_SALES = os.environ.get('LIVE_SALES') == '1'
+LIVE_POLL_SECONDS = float(os.environ.get('LIVE_POLL_SECONDS', 5))
+# POST /api/orders needs `Authorization: Bearer <LIVE_ORDERS_TOKEN>`, or without a token
+# set, a request from the same host. Bodies are limited to LIVE_ORDERS_MAX_BYTES
+LIVE_ORDERS_TOKEN = os.environ.get('LIVE_ORDERS_TOKEN')
+LIVE_ORDERS_MAX_BYTES = int(os.environ.get('LIVE_ORDERS_MAX_BYTES', 10_000_000))
+LOOPBACK = {'127.0.0.1', '::1'}
+
+
+class LiveSales:
+    def __init__(self, partition, base_version, incoming_dir, on_update=None):
+        self.partition = partition
+        self.base_version = base_version
+        self.version = base_version
+        self.incoming_dir = pathlib.Path(incoming_dir)
+        self.on_update = on_update
+        self.files = []
+        self.rejected = set()
+        # (version, weekdays, months) for every batch, so a browser can ask what
+        # changed since the version it last drew
+        self.history = []
+        self.known_orders = np.unique(partition.df['order_id'].to_numpy())
+        # order keys of the ingested batches, sorted
+        self.new_orders = np.array([], dtype=np.int64)
+        self.lock = threading.Lock()
+
+    # Marks lines of orders that were already seen, in this batch or before it.
+    # known_orders is sorted, so each key is a binary search rather than a scan
+    # new_orders, the (much smaller) keys ingested since, are matched with np.isin
+    def flag_multiple_orders(self, batch):
+        keys = batch['order_id'].to_numpy()
+        seen = np.zeros(len(keys), dtype=bool)
+        if len(self.known_orders):
+            positions = np.searchsorted(self.known_orders, keys).clip(max=len(self.known_orders) - 1)
+            seen = self.known_orders[positions] == keys
+        seen |= np.isin(keys, self.new_orders)
+        batch['multiple_orders'] = (seen | batch.duplicated('order_id').to_numpy()).astype(np.int8)
+        self.new_orders = np.union1d(self.new_orders, keys)
+
+    # The prepared lines of a batch, if they belong to the partition's year. Lines of another
+    # year would land in this year's cube and calendar
+    def prepare(self, raw):
+        batch = prepare_sales(raw)
+        years = sorted(int(year) for year in batch['date'].dt.year.unique())
+        if years and years != [self.partition.year]:
+            raise ValueError(f'orders from {", ".join(map(str, years))}, this store only takes {self.partition.year}')
+        return batch
+
+    def ingest(self, name, raw):
+        batch = self.prepare(raw)
+        self.flag_multiple_orders(batch)
+        self.partition.add(batch)
+        self.files.append(name)
+        # derived from the files seen so far, so every worker that ingested the same
+        # files reports the same version
+        self.version = self.base_version + '-' + hashlib.sha1('\n'.join(self.files).encode()).hexdigest()[:8]
+        weekdays = sorted(batch['day_of_week'].unique().tolist())
+        months = sorted(int(month) for month in batch['month'].unique())
+        self.history.append((self.version, weekdays, months))
+        if self.on_update:
+            self.on_update(self.version)
+
+    # Ingests the incoming files not seen yet, in name order
+    def poll(self):
+        with self.lock:
+            for path in sorted(self.incoming_dir.glob('*.csv')):
+                if path.name in self.files or path.name in self.rejected:
+                    continue
+                try:
+                    self.ingest(path.name, read_sales(path))
+                except ValueError:
+                    logging.getLogger(__name__).exception('skipping malformed sales file %s', path.name)
+                    self.rejected.add(path.name)
+
+    def watch(self):
+        def run():
+            while True:
+                time.sleep(LIVE_POLL_SECONDS)
+                self.poll()
+        thread = threading.Thread(target=run, name='live-sales-watch', daemon=True)
+        thread.start()
+        return thread
+
+    # What changed after `version`: None if nothing (or if this worker doesn't know
+    # that version yet), else the new version and the affected weekdays and months
+    def changes_since(self, version):
+        if version == self.version:
+            return None
+        versions = [entry[0] for entry in self.history]
+        if version == self.base_version:
+            newer = self.history
+        elif version in versions:
+            newer = self.history[versions.index(version) + 1:]
+        else:
+            return None
+        return {
+            'version': self.version,
+            'days': sorted({day for entry in newer for day in entry[1]}),
+            'months': sorted({month for entry in newer for month in entry[2]}),
+        }
+
+    # POST /api/orders takes order lines as CSV (same columns as SQL_output.csv), drops
+    # them in the incoming directory for every worker and ingests them here right away
+    def register_routes(self, server):
+        @server.route('/api/orders', methods=['POST'])
+        def append_orders():
+            if not authorized():
+                return jsonify({'error': 'not allowed'}), 403
+            if request.content_length is None or request.content_length > LIVE_ORDERS_MAX_BYTES:
+                return jsonify({'error': f'send a Content-Length of at most {LIVE_ORDERS_MAX_BYTES} bytes'}), 413
+            body = request.get_data()
+            try:
+                rows = len(self.prepare(read_sales(io.BytesIO(body))))
+            except ValueError as error:
+                return jsonify({'error': str(error)}), 400
+            name = f'{time.time_ns()}-{os.getpid()}.csv'
+            atomic_write_text(self.incoming_dir.joinpath(name), body.decode())
+            self.poll()
+            return jsonify({'file': name, 'rows': rows, 'version': self.version}), 202
+
+
+def authorized():
+    if LIVE_ORDERS_TOKEN:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {LIVE_ORDERS_TOKEN}')
+    return request.remote_addr in LOOPBACK
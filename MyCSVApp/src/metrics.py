@@ -0,0 +1,270 @@
+import collections
+import contextlib
+import os
+import pathlib
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+from flask import Response, g, request
+
+from data_cache import CACHE_DIR
+
+# Timing of the data preparation stages, figure builds and requests (every Dash callback
+# is one POST to /_dash-update-component), kept as histograms per worker and served
+# by GET /metrics in the Prometheus text format. For each measurement:
+#   seconds        wall time
+#   rows           rows scanned (cube cells, order lines in a time window, prepared lines)
+#   payload_bytes  size of the figure or of the response
+#   peak_bytes     with METRICS_TRACE_MEMORY=1, the most memory allocated (tracemalloc)
+#                  above the start, for stages and requests. It slows everything down a bit
+#                  and is shared by the threads of a worker, so it's approximate
+# The startup of app.py is timed stage by stage too (kind="startup", see Startup), against a
+# budget of STARTUP_BUDGET_SECONDS.
+# With PROFILE_SLOW_SECONDS=<n>, requests are sampled every PROFILE_INTERVAL seconds, and
+# the stacks of those that take longer than n seconds are written to PROFILE_DIR in the
+# collapsed format that flamegraph.pl and speedscope read.
+TRACE_MEMORY = os.environ.get('METRICS_TRACE_MEMORY') == '1'
+PROFILE_SLOW_SECONDS = float(os.environ.get('PROFILE_SLOW_SECONDS', 0))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+PROFILE_DIR = pathlib.Path(os.environ.get('PROFILE_DIR', CACHE_DIR.joinpath('profiles')))
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 3))
+
+# up to gunicorn's 600 second timeout (Procfile)
+SECONDS_BUCKETS = [.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+ROWS_BUCKETS = [10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+BYTES_BUCKETS = [1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000, 1_000_000_000]
+BUCKETS = {'seconds': SECONDS_BUCKETS, 'rows': ROWS_BUCKETS, 'payload_bytes': BYTES_BUCKETS, 'peak_bytes': BYTES_BUCKETS}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (quantity, kind, name) -> Histogram
+        self.slow = collections.Counter()  # (kind, name) -> profiles written
+
+    def observe(self, quantity, kind, name, value):
+        with self.lock:
+            key = (quantity, kind, name)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(BUCKETS[quantity])
+            self.histograms[key].observe(value)
+
+    # Prometheus text format, one histogram per quantity labelled by kind and name
+    def render(self):
+        worker = os.getpid()
+        lines = []
+        with self.lock:
+            for quantity in BUCKETS:
+                metric = f'dashboard_{quantity}'
+                lines.append(f'# TYPE {metric} histogram')
+                for (q, kind, name), histogram in sorted(self.histograms.items()):
+                    if q != quantity:
+                        continue
+                    labels = f'kind="{label(kind)}",name="{label(name)}",worker="{worker}"'
+                    total = 0
+                    for bound, count in zip(histogram.buckets + ['+Inf'], histogram.counts):
+                        total += count
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {total}')
+                    lines.append(f'{metric}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+            lines.append('# TYPE dashboard_slow_profiles_total counter')
+            for (kind, name), count in sorted(self.slow.items()):
+                lines.append(f'dashboard_slow_profiles_total{{kind="{label(kind)}",name="{label(name)}",worker="{worker}"}} {count}')
+        # ru_maxrss is in kilobytes on Linux
+        lines.append('# TYPE dashboard_max_rss_bytes gauge')
+        lines.append(f'dashboard_max_rss_bytes{{worker="{worker}"}} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}')
+        return '\n'.join(lines) + '\n'
+
+
+# A label value escaped for the text format
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+local = threading.local()
+# Called with every measurement as it begins, e.g. to report a background job's progress
+# (see jobs.py)
+listeners = []
+
+
+class Measurement:
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.rows = 0
+        self.payload_bytes = None
+        self.start = time.perf_counter()
+        self.trace_memory = TRACE_MEMORY and not getattr(local, 'stack', None)
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.start
+        registry.observe('seconds', self.kind, self.name, self.seconds)
+        registry.observe('rows', self.kind, self.name, self.rows)
+        if self.payload_bytes is not None:
+            registry.observe('payload_bytes', self.kind, self.name, self.payload_bytes)
+        if self.trace_memory:
+            registry.observe('peak_bytes', self.kind, self.name, max(tracemalloc.get_traced_memory()[1] - self.memory_start, 0))
+
+
+def begin(kind, name):
+    measurement = Measurement(kind, name)
+    for listener in listeners:
+        listener(measurement)
+    local.stack = getattr(local, 'stack', []) + [measurement]
+    return measurement
+
+
+def end(measurement):
+    local.stack = [m for m in local.stack if m is not measurement]
+    measurement.finish()
+
+
+# with measure('stage', 'prepare'): ... records one measurement of the block
+@contextlib.contextmanager
+def measure(kind, name):
+    measurement = begin(kind, name)
+    try:
+        yield measurement
+    finally:
+        end(measurement)
+
+
+# Counts rows scanned towards every measurement running in this thread
+def add_rows(count):
+    for measurement in getattr(local, 'stack', ()):
+        measurement.rows += int(count)
+
+
+# Times the stages of a process's startup from `started`, a time.perf_counter() taken
+# before the first import. Each stage() closes the stage running since the previous one
+class Startup:
+    def __init__(self, started):
+        self.started = self.last = started
+        self.stages = []
+
+    def stage(self, name):
+        now = time.perf_counter()
+        self.stages.append((name, now - self.last))
+        registry.observe('seconds', 'startup', name, now - self.last)
+        self.last = now
+
+    @property
+    def seconds(self):
+        return self.last - self.started
+
+    def over_budget(self, budget=STARTUP_BUDGET_SECONDS):
+        return budget > 0 and self.seconds > budget
+
+    def report(self):
+        stages = ', '.join(f'{name} {seconds:.2f}s' for name, seconds in self.stages)
+        return f'started in {self.seconds:.2f}s ({stages}), budget {STARTUP_BUDGET_SECONDS:g}s'
+
+
+# Samples the stack of one thread from a background thread while a request runs
+class Sampler:
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='metrics-sampler', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({pathlib.Path(code.co_filename).name}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def write(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common()))
+
+
+# Measures every request to `server` and serves GET /metrics. `callback_names` maps the
+# output of each Dash callback (as in the request body) to the name to report it by.
+# Requests are named by their route (e.g. /assets/<path:path>), never by what the client
+# sent, so 404s and made-up outputs all go to 'other' and 'callback' instead of adding
+# histograms without limit
+def register_routes(server, callback_names=None):
+    callback_names = callback_names or {}
+
+    @server.before_request
+    def start_request():
+        name = request.url_rule.rule if request.url_rule is not None else 'other'
+        if request.path.endswith('/_dash-update-component'):
+            output = (request.get_json(silent=True) or {}).get('output', '')
+            name = callback_names.get(output, 'callback') if isinstance(output, str) else 'callback'
+        g.measurement = begin('request', name)
+        g.sampler = Sampler(threading.get_ident()) if PROFILE_SLOW_SECONDS else None
+
+    @server.after_request
+    def finish_request(response):
+        measurement = g.pop('measurement', None)
+        if measurement is None:
+            return response
+        if response.status_code == 304:
+            measurement.payload_bytes = 0  # the body isn't sent
+        elif not response.direct_passthrough:
+            measurement.payload_bytes = len(response.get_data())
+        end(measurement)
+        sampler = g.pop('sampler', None)
+        if sampler is not None:
+            sampler.stop()
+            if measurement.seconds >= PROFILE_SLOW_SECONDS:
+                registry.slow[(measurement.kind, measurement.name)] += 1
+                stamp = f'{time.strftime("%Y%m%d-%H%M%S")}.{int(time.time() * 1000) % 1000:03d}'
+                sampler.write(PROFILE_DIR.joinpath(f'{stamp}-{os.getpid()}-{safe_name(measurement.name)}.txt'))
+        return response
+
+    # a request that raised never reaches after_request
+    @server.teardown_request
+    def drop_request(error):
+        measurement = g.pop('measurement', None)
+        if measurement is not None:
+            end(measurement)
+        sampler = g.pop('sampler', None)
+        if sampler is not None:
+            sampler.stop()
+
+    @server.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def safe_name(name):
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in name).strip('_')[:80]
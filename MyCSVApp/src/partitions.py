@@ -0,0 +1,282 @@
+import concurrent.futures
+import functools
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from baskets import BasketCounts
+from cube import SalesCube, combine_cells, load_sales_cube
+from data_cache import CACHE_DIR, dataset_version, file_digest, is_cached, load_cached, load_prepared_sales
+from ingredients import IngredientMatrix, sales_ingredient_pairs
+from metrics import add_rows, measure
+from prepare import day_order
+from streaming import STREAMING_BUILD, summarize
+from timeline import TimeIndex, build_timeline
+
+# Sales partitioned by store and year, each in its own folder:
+#   data/stores/<store>/<year>/SQL_output.csv   (RainFall.csv next to it is optional)
+# Every partition is prepared and aggregated into its own cube, missing ones in a process
+# pool, and a selection of stores and years merges the cubes of just those partitions.
+# Without a stores folder, data/SQL_output.csv is the one partition, of store 'main'.
+# Rainfall falls back to data/<year>_RainFall.csv for partitions without their own.
+ALL = 'all'
+DEFAULT_STORE = 'main'
+
+# what a prepared partition has in the cache
+CACHED_KINDS = ['cube', 'ingredients', 'span', 'baskets'] if STREAMING_BUILD else ['sales', 'cube', 'ingredients', 'timeline']
+
+
+class Partition:
+    def __init__(self, store, year, path, rain_path=None):
+        self.store = store
+        self.year = year
+        self.path = path
+        self.rain_path = rain_path
+        self.cache_dir = CACHE_DIR.joinpath('stores', store, str(year))
+        self.version = None
+        self.df = None
+        self.cube = None
+        self.dates = None  # first and last date
+        self.ingredient_pairs = None
+        self.basket_counts = None
+        self.timeline = None
+
+    # Memory-maps the prepared frame, the cube and the flavor/ingredient pairs from the cache
+    def load(self):
+        if self.cube is None:
+            with measure('stage', 'load_partition'):
+                if STREAMING_BUILD:
+                    self.version = self.version or dataset_version(self.path)
+                    self.cube, self.ingredient_pairs, self.dates, self.basket_counts = load_streamed(self.path, self.version, self.cache_dir)
+                    return self
+                self.df, self.version = load_prepared_sales(self.path, self.cache_dir)
+                add_rows(len(self.df))
+                self.cube = load_sales_cube(self.df, self.version, self.cache_dir)
+                self.ingredient_pairs = load_ingredient_pairs(self.df, self.version, self.cache_dir)
+                dates = self.df['date']
+                self.dates = (dates.min(), dates.max())
+        return self
+
+
+    # Co-purchase counts of the partition's orders, built on first use
+    def baskets(self):
+        if self.basket_counts is None:
+            with measure('stage', 'partition_baskets'):
+                lines = self.df if self.df is not None else self.cube.order_lines()
+                add_rows(len(lines))
+                self.basket_counts = BasketCounts.from_lines(lines['order_id'], lines['pizza_flavor'], lines['size'])
+        return self.basket_counts
+
+    # Folds new order lines (see live.py) into the cube, the time index and, once they're
+    # built, the basket counts. Like the cube, the counts assume an order's lines arrive together
+    def add(self, lines):
+        self.cube.add(lines)
+        self.time_index().add(lines)
+        if self.basket_counts is not None:
+            added = BasketCounts.from_lines(lines['order_id'], lines['pizza_flavor'], lines['size'])
+            self.basket_counts = BasketCounts.merge([self.basket_counts, added])
+
+    # Date/time window queries (see timeline.py): a time-sorted copy of the lines, cached and
+    # memory-mapped like the frame. SQL partitions answer them with the orders_date index
+    def time_index(self):
+        if self.df is None:
+            if STREAMING_BUILD and self.path is not None:
+                raise ValueError(f'no time index for {self.store} {self.year}, STREAMING_BUILD keeps no order lines')
+            return self.cube
+        if self.timeline is None:
+            with measure('stage', 'load_timeline'):
+                self.timeline = TimeIndex(load_timeline(self.df, self.version, self.cache_dir))
+        return self.timeline
+
+
+def rain_path(data_path, folder, year):
+    for path in [folder.joinpath('RainFall.csv'), data_path.joinpath(f'{year}_RainFall.csv')]:
+        if path.exists():
+            return path
+    return None
+
+
+def discover_partitions(data_path):
+    partitions = []
+    for path in sorted(data_path.glob('stores/*/*/SQL_output.csv')):
+        store, year = path.parent.parent.name, int(path.parent.name)
+        partitions.append(Partition(store, year, path, rain_path(data_path, path.parent, year)))
+    if not partitions:
+        path = data_path.joinpath('SQL_output.csv')
+        years = file_years(path)
+        # a partition holds one year: the cube has no year, and the rainfall, the year
+        # picker and the date windows all go by the partition's year
+        if len(years) > 1:
+            raise ValueError(f'{path} has sales from {years[0]} to {years[-1]}, put each year in data/stores/<store>/<year>/SQL_output.csv')
+        year = years[0]
+        partitions.append(Partition(DEFAULT_STORE, year, path, rain_path(data_path, data_path, year)))
+    return partitions
+
+
+# Years the sales of a CSV cover, read once per version of the file
+def file_years(path):
+    def build():
+        dates = pd.read_csv(path, usecols=['date'], dtype='category')['date'].cat.categories
+        return pd.DataFrame({'year': sorted({int(date[:4]) for date in dates})})
+    return load_cached('years', dataset_version(path), build)['year'].tolist()
+
+
+# DATA_BACKEND=sql: the four source tables are one partition, answered by SqlCube
+def sql_partitions(data_path):
+    from sql_store import SqlCube
+    cube = SqlCube(data_path)
+    dates = cube.values('date')
+    year = int(dates[0][:4])
+    if int(dates[-1][:4]) != year:
+        raise ValueError(f'pizza_orders.csv has orders from {year} to {dates[-1][:4]}, the SQL backend takes a single year')
+    partition = Partition(DEFAULT_STORE, year, None, rain_path(data_path, data_path, year))
+    partition.cube, partition.version, partition.dates = cube, cube.version, (dates[0], dates[-1])
+    partition.ingredient_pairs = cube.ingredient_pairs()
+    return [partition]
+
+
+def load_ingredient_pairs(df, version, cache_dir):
+    return load_cached('ingredients', version, lambda: sales_ingredient_pairs(df), cache_dir)
+
+
+def load_timeline(df, version, cache_dir):
+    return load_cached('timeline', version, lambda: build_timeline(df), cache_dir)
+
+
+# STREAMING_BUILD: the cube, ingredients, first and last date and basket counts all come
+# from one pass over the CSV in chunks (see streaming.py), and no frame of the lines is kept
+def load_streamed(path, version, cache_dir):
+    summary = functools.cache(lambda: summarize(path))
+    cube = SalesCube(load_cached('cube', version, lambda: summary().cells, cache_dir))
+    pairs = load_cached('ingredients', version, lambda: summary().ingredient_pairs, cache_dir)
+    span = load_cached('span', version, lambda: pd.DataFrame({'first': [summary().dates[0]], 'last': [summary().dates[1]]}), cache_dir)
+    baskets = BasketCounts.from_frame(load_cached('baskets', version, lambda: summary().baskets.to_frame(), cache_dir))
+    return cube, pairs, (span['first'][0], span['last'][0]), baskets
+
+
+# Runs in a pool process: prepares one partition and builds its cube into the cache
+def prepare_partition(path, cache_dir):
+    if STREAMING_BUILD:
+        load_streamed(path, dataset_version(path), cache_dir)
+        return
+    df, version = load_prepared_sales(path, cache_dir)
+    load_sales_cube(df, version, cache_dir)
+    load_ingredient_pairs(df, version, cache_dir)
+    load_timeline(df, version, cache_dir)
+
+
+# Days per month and number of each weekday actually covered by the date ranges, to turn
+# totals into per-day and per-week averages whatever stores and years are selected
+class Calendar:
+    def __init__(self, date_ranges):
+        dates = pd.DatetimeIndex([])
+        for first, last in date_ranges:
+            dates = dates.union(pd.date_range(first, last, freq='D'))
+        self.days_per_month = pd.Series(np.bincount(dates.month, minlength=13)[1:], index=range(1, 13))
+        self.weekdays = pd.Series(np.bincount(dates.dayofweek, minlength=7), index=day_order)
+        # [month x weekday] number of each weekday in each month
+        counts = np.bincount((dates.month - 1) * 7 + dates.dayofweek, minlength=12 * 7).reshape(12, 7)
+        self.weekdays_per_month = pd.DataFrame(counts, index=range(1, 13), columns=day_order)
+        self.last_date = dates.max()
+
+
+# The merged cube, calendar, rainfall, ingredients and baskets of the partitions a selection covers
+class Selection:
+    def __init__(self, partitions, cache_dir):
+        self.partitions = partitions
+        cubes = [partition.cube for partition in partitions]
+        # a single partition keeps its own cube, so live updates to it show up here. Merged
+        # cubes are cached too, so the workers memory-map the same pages instead of each
+        # holding its own merge
+        if len(cubes) == 1:
+            self.cube = cubes[0]
+        else:
+            version = hashlib.sha256('/'.join(str(partition.version) for partition in partitions).encode()).hexdigest()[:16]
+            self.cube = SalesCube(load_cached('cube', version, lambda: combine_cells([cube.cells for cube in cubes]), cache_dir))
+        self.calendar = Calendar([partition.dates for partition in partitions])
+        self.ingredients = IngredientMatrix(pd.concat([partition.ingredient_pairs for partition in partitions], ignore_index=True))
+        rain = [pd.read_csv(partition.rain_path) for partition in partitions if partition.rain_path]
+        if rain:
+            # averaged over the stores and years that have rainfall
+            self.rain = pd.concat(rain).groupby('month')[['rainfall']].mean()
+        else:
+            self.rain = pd.DataFrame({'rainfall': np.nan}, index=pd.Index(range(1, 13), name='month'))
+        self.basket_counts = None
+
+    # Co-purchase counts of the selected orders, added up over the partitions (see baskets.py).
+    # A single partition's are its own, like the cube, so live updates show up here
+    def baskets(self):
+        if len(self.partitions) == 1:
+            return self.partitions[0].baskets()
+        if self.basket_counts is None:
+            self.basket_counts = BasketCounts.merge(partition.baskets() for partition in self.partitions)
+        return self.basket_counts
+
+
+class SalesPartitions:
+    # lazy: only version the partitions, each is prepared by the first selection that loads it
+    def __init__(self, partitions, processes=None, lazy=False):
+        self.partitions = partitions
+        self.stores = sorted({partition.store for partition in partitions})
+        self.years = sorted({partition.year for partition in partitions})
+        self.selections = {}
+        self.lock = threading.Lock()
+        self.prepare(processes, build=not lazy)
+        # one version for the whole dataset, every figure is keyed by its selection
+        sha = hashlib.sha256()
+        for partition in partitions:
+            sha.update(f'{partition.store}/{partition.year}/{partition.version}'.encode())
+            if partition.rain_path:
+                sha.update(file_digest(partition.rain_path).encode())
+        self.version = sha.hexdigest()[:16]
+
+    @classmethod
+    def discover(cls, data_path, processes=None, lazy=False):
+        return cls(discover_partitions(data_path), processes, lazy)
+
+    # Versions every partition and prepares the ones not cached yet, in parallel. Under
+    # gunicorn this already runs in the master (see gunicorn.conf.py), so the workers
+    # find everything cached and only memory-map it
+    def prepare(self, processes, build=True):
+        missing = []
+        for partition in self.partitions:
+            if partition.version is None:
+                # hashed here, one at a time, so the pool processes don't race on the digest index
+                partition.version = dataset_version(partition.path)
+            if build and partition.cube is None and not all(is_cached(kind, partition.version, partition.cache_dir) for kind in CACHED_KINDS):
+                missing.append(partition)
+        if len(missing) == 1:
+            with measure('stage', 'prepare_partitions'):
+                prepare_partition(missing[0].path, missing[0].cache_dir)
+        elif len(missing) > 1:
+            with measure('stage', 'prepare_partitions'), concurrent.futures.ProcessPoolExecutor(min(len(missing), processes or os.cpu_count())) as pool:
+                for future in [pool.submit(prepare_partition, p.path, p.cache_dir) for p in missing]:
+                    future.result()
+
+    # Loaded partitions of `store` (or ALL) for the years from `start` to `end`
+    def window_partitions(self, store, start, end):
+        partitions = [p for p in self.partitions if store in (ALL, p.store) and start.year <= p.year <= end.year]
+        if not partitions:
+            raise KeyError(f'no sales for store {store!r} from {start.year} to {end.year}')
+        with self.lock:
+            return [partition.load() for partition in partitions]
+
+    def years_of(self, store):
+        return sorted({p.year for p in self.partitions if store == ALL or p.store == store})
+
+    # Merged data for one store (or ALL) and one year (or ALL). Only the partitions in the
+    # selection are loaded, and each selection is merged once
+    def select(self, store=ALL, year=ALL):
+        key = (store, year)
+        with self.lock:
+            if key not in self.selections:
+                partitions = [p for p in self.partitions if store in (ALL, p.store) and year in (ALL, p.year)]
+                if not partitions:
+                    raise KeyError(f'no sales for store {store!r} in {year!r}')
+                partitions = [partition.load() for partition in partitions]
+                with measure('stage', 'select'):
+                    self.selections[key] = Selection(partitions, CACHE_DIR.joinpath('selections', f'{store}-{year}'))
+            return self.selections[key]
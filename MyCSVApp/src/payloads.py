@@ -0,0 +1,131 @@
+import base64
+import gzip
+import json
+import os
+
+import numpy as np
+from flask import request
+
+# Smaller responses for every tab, with the figures drawn the same:
+# - figures carry their numeric trace arrays as base64 typed arrays
+#   ({'dtype': 'f8', 'bdata': ...}), which plotly.js 2.28+ decodes itself, and their
+#   template keeps only the styles of the trace types they have (the defaults for the 25
+#   types are more than half of a small figure). They are packed once when built, so the
+#   figure cache and every callback response hold them that way
+# - responses are gzipped for clients that accept it
+# - GET responses (the page layout, /api/*) get a weak ETag, and a request whose
+#   If-None-Match still matches gets a bodyless 304. Callbacks are POSTs, which browsers
+#   never revalidate, those rely on the figure cache instead
+# Dash encodes the rest with orjson when it's installed (pip install orjson).
+# COMPACT_RESPONSES=0 sends everything as before.
+COMPACT_RESPONSES = os.environ.get('COMPACT_RESPONSES', '1') == '1'
+GZIP_MIN_BYTES = 1_000
+GZIP_LEVEL = 6
+GZIP_TYPES = {'application/json', 'application/javascript', 'text/html', 'text/css', 'text/plain', 'text/javascript'}
+
+# trace attributes holding one value per point, the only ones plotly.js decodes
+DATA_ARRAYS = {'x', 'y', 'z', 'values', 'customdata', 'size', 'color', 'base', 'width', 'lat', 'lon', 'r', 'theta', 'open', 'high', 'low', 'close'}
+# below this many values the array is never shorter packed
+MIN_PACKED = 8
+
+
+# The values as a typed array spec, or None when they aren't all numbers (text, None
+# for gaps, booleans) or don't fit a type plotly.js has
+def typed_array(values):
+    try:
+        array = np.asarray(values)
+    except ValueError:  # ragged
+        return None
+    if array.ndim not in (1, 2) or array.size < MIN_PACKED or array.dtype.kind not in 'iuf':
+        return None
+    if array.dtype.kind == 'f':
+        dtype = np.dtype('<f8')
+    else:
+        dtype = np.result_type(np.min_scalar_type(array.min()), np.min_scalar_type(array.max())).newbyteorder('<')
+        if dtype.itemsize > 4:  # no 64 bit integers in plotly.js
+            if np.abs(array).max() > 2**53:
+                return None
+            dtype = np.dtype('<f8')
+    spec = {'dtype': f'{dtype.kind}{dtype.itemsize}', 'bdata': base64.b64encode(array.astype(dtype).tobytes()).decode()}
+    if array.ndim == 2:
+        spec['shape'] = f'{array.shape[0]},{array.shape[1]}'
+    return spec
+
+
+def pack_trace(trace):
+    packed = {}
+    for key, value in trace.items():
+        if isinstance(value, dict):
+            value = pack_trace(value)
+        elif isinstance(value, list) and key in DATA_ARRAYS:
+            spec = typed_array(value)
+            if spec is not None and len(json.dumps(spec)) < len(json.dumps(value)):
+                value = spec
+        packed[key] = value
+    return packed
+
+
+# A figure dict (as plotly's to_json gives it) with its trace arrays packed and its
+# template trimmed
+def pack_figure(figure):
+    data = figure.get('data', [])
+    layout = figure.get('layout', {})
+    template = layout.get('template')
+    if template and 'data' in template:
+        types = {trace.get('type', 'scatter') for trace in data}
+        template = {**template, 'data': {kind: styles for kind, styles in template['data'].items() if kind in types}}
+        layout = {**layout, 'template': template}
+    return {**figure, 'data': [pack_trace(trace) for trace in data], 'layout': layout}
+
+
+# The values of a typed array spec, the way plotly.js decodes them
+def unpack(spec):
+    array = np.frombuffer(base64.b64decode(spec['bdata']), dtype=np.dtype(spec['dtype']).newbyteorder('<'))
+    if 'shape' in spec:
+        array = array.reshape([int(n) for n in spec['shape'].split(',')])
+    return array
+
+
+# gzipped bodies of static files and of Dash's script bundles, by ETag
+compressed_files = {}
+
+
+def register_routes(server):
+    @server.after_request
+    def compact_response(response):
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        # files and Dash's script bundles (which come with an ETag, or are fingerprinted
+        # to be kept a year) are the same for every client, so they're only gzipped once
+        etag = response.get_etag()[0]
+        static = etag is not None or bool(response.cache_control.max_age)
+        if request.method == 'GET' and etag is None:
+            response.add_etag(weak=True)
+            etag = response.get_etag()[0]
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+        if response.mimetype not in GZIP_TYPES or not accepts_gzip():
+            return response
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < GZIP_MIN_BYTES:
+            return response
+        if not static:
+            return encoded(response, gzip.compress(data, GZIP_LEVEL))
+        if etag not in compressed_files:
+            compressed_files[etag] = gzip.compress(data, GZIP_LEVEL)
+        # the gzipped body is only equivalent to the plain one, not byte for byte the same
+        response.set_etag(etag, weak=True)
+        return encoded(response, compressed_files[etag])
+
+
+def accepts_gzip():
+    return request.accept_encodings['gzip'] > 0
+
+
+def encoded(response, data):
+    response.set_data(data)
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
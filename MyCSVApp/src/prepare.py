@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday','Sunday']
+
+# Explicit schema for SQL_output.csv. Low cardinality text columns are read
+# straight into categoricals so each distinct value is parsed and stored once
+SALES_SCHEMA = {
+    'pizza_id': 'category',
+    'quantity': 'int16',
+    'date': 'category',
+    'time': 'category',
+    'size': 'category',
+    'price': 'float64',
+    'category': 'category',
+    'pizza_type_id': 'category',
+    'ingredients': 'category',
+}
+DATE_FORMAT = '%Y-%m-%d'
+TIME_FORMAT = '%H:%M:%S'
+
+
+def read_sales(path, **kwargs):
+    return pd.read_csv(path, usecols=list(SALES_SCHEMA), dtype=SALES_SCHEMA, **kwargs)
+
+
+# Parses a categorical column of dates/times by parsing only its distinct values
+def parse_categorical(values, format):
+    codes = values.cat.codes.to_numpy()
+    if (codes < 0).any():
+        raise ValueError(f"'{values.name}' has missing values")
+    return pd.to_datetime(values.cat.categories, format=format).take(codes)
+
+
+# Order id of each line: seconds since 1970 of the order's date and time, so all the
+# lines of one order share the same integer key
+def order_ids(dates, times):
+    seconds = times.hour.to_numpy(np.int64) * 3600 + times.minute.to_numpy() * 60 + times.second.to_numpy()
+    return dates.to_numpy('datetime64[D]').astype(np.int64) * 86400 + seconds
+
+
+# Turns the raw SQL_output.csv frame into the frame the dashboard works with
+def prepare_sales(df):
+    df = df.rename(columns={'pizza_type_id': 'pizza_flavor'}) # I think this name is more appropriate
+
+    # Splitting the date into month and days
+    dates = parse_categorical(df['date'], DATE_FORMAT)
+    times = parse_categorical(df['time'], TIME_FORMAT)
+    df['date'] = dates
+    df['month'] = dates.month.to_numpy(np.int8)
+    df['day'] = dates.day.to_numpy(np.int8)
+    df['day_of_week'] = pd.Categorical.from_codes(dates.dayofweek, categories=day_order, ordered=True)
+    df['hour'] = times.hour.to_numpy(np.int8)
+
+    # Creating order id
+    df['order_id'] = order_ids(dates, times)
+
+    # Create 'multiple_orders' column, 1 if the order_id is duplicated, 0 if not
+    df['multiple_orders'] = df.duplicated('order_id').astype(np.int8)
+
+    # 'ingredients' stays a categorical, one code per line. The flavor x ingredient
+    # matrix is built from its distinct values (see ingredients.py) instead of adding
+    # a dummy column per ingredient to every line
+    return df
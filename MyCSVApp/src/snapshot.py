@@ -0,0 +1,279 @@
+import html
+import json
+import os
+import pathlib
+import shutil
+import sys
+
+from flask import Flask, abort, send_from_directory
+
+# A snapshot of the report: every tab and every slider position of every store and year,
+# rendered once by the full app into static files that any file server or CDN can serve.
+#
+#   python snapshot.py build [directory]
+#
+# writes, per selection, <store>/<year>/index.html (the whole report as one page, with the
+# tabs and sliders switched in the browser), tab-<n>.json (the Dash layout of each tab)
+# and sliders.json (the figure of every slider position, as in CLIENTSIDE_SLIDERS), plus a
+# manifest.json and an index.html that opens the default selection.
+#
+#   SNAPSHOT_DIR=<directory> gunicorn --chdir src snapshot:server
+#
+# serves a snapshot with nothing but Flask, no pandas or plotly. It is only as fresh as
+# its last build, the live app is still the one for LIVE_SALES and what-if work.
+PATH = pathlib.Path(__file__).parent
+SNAPSHOT_DIR = pathlib.Path(os.environ.get('SNAPSHOT_DIR', PATH.joinpath('snapshot'))).resolve()
+PLOTLY_JS = 'https://cdn.plot.ly/plotly-{version}.min.js'
+
+# style values React leaves without a unit
+UNITLESS = {'fontWeight', 'flex', 'flexGrow', 'flexShrink', 'lineHeight', 'opacity', 'order', 'zIndex'}
+
+
+# Dash's camelCase style dict as a CSS declaration list
+def css(style):
+    declarations = []
+    for key, value in (style or {}).items():
+        name = ''.join(f'-{c.lower()}' if c.isupper() else c for c in key)
+        if isinstance(value, (int, float)) and key not in UNITLESS:
+            value = f'{value}px'
+        declarations.append(f'{name}: {value}')
+    return '; '.join(declarations)
+
+
+def attributes(**values):
+    return ''.join(f' {name}="{html.escape(str(value))}"' for name, value in values.items() if value)
+
+
+# Static HTML for a tree of dash html/dcc components. Graphs become empty divs that the
+# page plots from `figures` (figures by graph id), sliders become range inputs over their marks
+def render(component, figures):
+    if component is None:
+        return ''
+    if isinstance(component, (str, int, float)):
+        return html.escape(str(component))
+    if isinstance(component, (list, tuple)):
+        return ''.join(render(child, figures) for child in component)
+
+    kind = type(component).__name__
+    props = component.to_plotly_json()['props']
+    style = css(props.get('style'))
+    if kind == 'Graph':
+        figure = props.get('figure')
+        if figure is not None:
+            figures[props['id']] = figure
+        return f'<div class="graph"{attributes(id=props.get("id"), style=style)}></div>'
+    if kind == 'Slider':
+        marks = props.get('marks') or {}
+        values = list(marks)
+        labels = [mark['label'] if isinstance(mark, dict) else mark for mark in marks.values()]
+        return (f'<div class="slider"><input type="range" min="0" max="{len(values) - 1}" step="1"'
+                f' id="{html.escape(props["id"])}" value="{values.index(props["value"]) if props["value"] in values else 0}"'
+                f" data-values='{html.escape(json.dumps([str(value) for value in values]))}'"
+                f" data-labels='{html.escape(json.dumps(labels))}'>"
+                f' <span class="slider-label"></span></div>')
+    if kind == 'Store':
+        return ''
+    if kind == 'Link':
+        tag, extra = 'a', attributes(href=props.get('href'), target=props.get('target'))
+    else:
+        tag, extra = kind.lower(), ''
+    return f'<{tag}{attributes(id=props.get("id"), style=style)}{extra}>{render(props.get("children"), figures)}</{tag}>'
+
+
+def find(component, id):
+    if getattr(component, 'id', None) == id:
+        return component
+    children = getattr(component, 'children', None)
+    for child in children if isinstance(children, (list, tuple)) else [children]:
+        if child is not None and not isinstance(child, (str, int, float)):
+            found = find(child, id)
+            if found is not None:
+                return found
+    return None
+
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{stylesheets}
+<script src="{plotly}"></script>
+<style>
+.tabs {{ {tabs_style}; display: flex; }}
+.tabs button {{ {tab_style}; flex: 1; cursor: pointer; font: inherit; }}
+.tabs button.selected {{ {tab_selected_style} }}
+.pane {{ display: none; }}
+.pane.selected {{ display: block; }}
+.slider {{ display: flex; align-items: center; gap: 20px; margin: 20px 0; }}
+.slider input {{ flex: 1; }}
+</style>
+</head>
+<body style="margin: 0">
+<div style="{root_style}">
+{header}
+<div>{selections}</div>
+<div class="tabs">{buttons}</div>
+{panes}
+</div>
+<script type="application/json" id="figures">{figures}</script>
+<script type="application/json" id="sliders">{sliders}</script>
+<script>
+var figures = JSON.parse(document.getElementById('figures').textContent);
+var sliders = JSON.parse(document.getElementById('sliders').textContent);
+
+// the figure a slider graph shows for a slider value, as in assets/clientside.js
+function sliderFigure(store, value) {{
+    var state = store.states[value];
+    return state && {{data: state.data, layout: Object.assign({{}}, store.layout, state.layout)}};
+}}
+
+function plot(graph, figure) {{
+    if (figure) {{
+        Plotly.react(graph, figure.data, figure.layout, figure.config || {{}});
+    }}
+}}
+
+// graphs are drawn when their tab is first shown, hidden ones would get no width
+function showTab(tab) {{
+    document.querySelectorAll('.tabs button').forEach(function(button) {{
+        button.classList.toggle('selected', button.dataset.tab === tab);
+    }});
+    document.querySelectorAll('.pane').forEach(function(pane) {{
+        pane.classList.toggle('selected', pane.id === tab);
+        if (pane.id !== tab || pane.dataset.drawn) {{
+            return;
+        }}
+        pane.dataset.drawn = '1';
+        pane.querySelectorAll('.graph').forEach(function(graph) {{
+            plot(graph, figures[graph.id]);
+        }});
+        pane.querySelectorAll('.slider input').forEach(moveSlider);
+    }});
+}}
+
+function moveSlider(input) {{
+    var values = JSON.parse(input.dataset.values), labels = JSON.parse(input.dataset.labels);
+    input.parentNode.querySelector('.slider-label').textContent = labels[input.value];
+    Object.keys(sliders).forEach(function(id) {{
+        if (sliders[id].slider === input.id) {{
+            plot(document.getElementById(id), sliderFigure(sliders[id].store, values[input.value]));
+        }}
+    }});
+}}
+
+document.querySelectorAll('.tabs button').forEach(function(button) {{
+    button.addEventListener('click', function() {{ showTab(button.dataset.tab); }});
+}});
+document.querySelectorAll('.slider input').forEach(function(input) {{
+    input.addEventListener('input', function() {{ moveSlider(input); }});
+}});
+showTab('{tab}');
+</script>
+</body>
+</html>
+'''
+
+
+# JSON that can sit inside a <script> element (figures are plain dicts, see figure_cache.py)
+def script_json(value):
+    return json.dumps(value, separators=(',', ':')).replace('</', '<\\/')
+
+
+def build(directory=SNAPSHOT_DIR):
+    # the full pipeline, once
+    import plotly.offline
+    import plotly.utils
+
+    import app
+    from live import LIVE_SALES
+    from partitions import ALL
+
+    if LIVE_SALES:
+        raise ValueError('a snapshot needs LIVE_SALES off, it would miss every order after the build')
+    directory = pathlib.Path(directory)
+    sales = app.sales
+    # graph: its slider and the store of its figures per slider position
+    slider_graphs = {
+        'heatmap-graph': ('day-slider', lambda store, year: app.day_slider_store(app.update_heatmap, store, year)),
+        'employee-area-chart': ('day-slider', lambda store, year: app.day_slider_store(app.generate_employee_area_chart, store, year)),
+        'scatterplot': ('month-slider', lambda store, year: app.month_slider_store(app.update_scatterplot, store, year)),
+    }
+    header, tabs = app.app.layout.children[0], find(app.app.layout, 'tabs')
+    # every choice of the store and year pickers, which are hidden with a single partition
+    if len(sales.partitions) > 1:
+        selections = [(store, option['value']) for store in [ALL] + sales.stores for option in app.year_options(store)]
+    else:
+        selections = [(app.DEFAULT_STORE, app.DEFAULT_YEAR)]
+
+    def label(store, year):
+        return f'{"All stores" if store == ALL else store}, {"all years" if year == ALL else year}'
+
+    links = ' | '.join(f'<a href="../../{store}/{year}/index.html" style="color: #7FDBFF">{html.escape(label(store, year))}</a>'
+                       for store, year in selections) if len(selections) > 1 else ''
+    stylesheets = '\n'.join(f'<link rel="stylesheet" href="{href}">' for href in app.external_stylesheets)
+    # only ever clear a directory that holds an earlier snapshot
+    if directory.joinpath('manifest.json').exists():
+        shutil.rmtree(directory)
+
+    for store, year in selections:
+        target = directory.joinpath(str(store), str(year))
+        target.mkdir(parents=True, exist_ok=True)
+        figures, buttons, panes = {}, [], []
+        for tab in tabs.children:
+            content = app.tab_content(tab.value, store, year)
+            target.joinpath(f'{tab.value}.json').write_text(json.dumps(content, cls=plotly.utils.PlotlyJSONEncoder))
+            buttons.append(f'<button data-tab="{tab.value}">{html.escape(tab.label)}</button>')
+            panes.append(f'<div class="pane" id="{tab.value}">{render(content, figures)}</div>')
+        sliders = {graph: {'slider': slider, 'store': builder(store, year)} for graph, (slider, builder) in slider_graphs.items()}
+        target.joinpath('sliders.json').write_text(json.dumps(sliders))
+        page = PAGE.format(
+            title=html.escape(f'{header.children} - {label(store, year)}'),
+            stylesheets=stylesheets,
+            plotly=PLOTLY_JS.format(version=plotly.offline.get_plotlyjs_version()),
+            tabs_style=css(app.tabs_styles),
+            tab_style=css(app.tab_style),
+            tab_selected_style=css(app.tab_selected_style),
+            root_style=html.escape(css(app.app.layout.style)),
+            header=render(header, figures),
+            selections=links,
+            buttons=''.join(buttons),
+            panes='\n'.join(panes),
+            figures=script_json(figures),
+            sliders=script_json(sliders),
+            tab=tabs.value,
+        )
+        target.joinpath('index.html').write_text(page)
+
+    shutil.copytree(PATH.joinpath('assets'), directory.joinpath('assets'), dirs_exist_ok=True)
+    directory.joinpath('manifest.json').write_text(json.dumps({
+        'version': app.DATASET_VERSION,
+        'default': [app.DEFAULT_STORE, app.DEFAULT_YEAR],
+        'selections': selections,
+        'tabs': [{'value': tab.value, 'label': tab.label} for tab in tabs.children],
+    }, indent=1))
+    default = f'{app.DEFAULT_STORE}/{app.DEFAULT_YEAR}/index.html'
+    directory.joinpath('index.html').write_text(f'<!DOCTYPE html><meta http-equiv="refresh" content="0; url={default}"><a href="{default}">Open the report</a>\n')
+    return selections
+
+
+# Thin serving mode: the snapshot's files and nothing else
+server = Flask(__name__)
+
+
+@server.route('/', defaults={'path': 'index.html'})
+@server.route('/<path:path>')
+def snapshot_file(path):
+    if SNAPSHOT_DIR.joinpath(path).is_dir():
+        path = f'{path.rstrip("/")}/index.html'
+    if not SNAPSHOT_DIR.joinpath(path).is_file():
+        abort(404)
+    return send_from_directory(SNAPSHOT_DIR, path)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['build']:
+        selections = build(*sys.argv[2:3])
+        print(f'{len(selections)} selection(s) written')
+    else:
+        server.run(port=8050)
@@ -0,0 +1,212 @@
+import contextlib
+import csv
+import datetime
+import hashlib
+import os
+import queue
+import sqlite3
+import tempfile
+
+import pandas as pd
+
+from data_cache import CACHE_DIR, file_digest
+from ingredients import ingredient_pairs
+from prepare import day_order
+
+# SQL backend: the four source tables behind SQL/SQLQuery_2.sql are loaded into a
+# local SQLite database (one per version of the CSVs), and the dashboard's group-bys
+# run against it instead of against the joined SQL_output.csv frame.
+SOURCE_TABLES = {
+    'pizza_order_details': ['order_details_id', 'order_id', 'pizza_id', 'quantity'],
+    'pizza_orders': ['order_id', 'date', 'time'],
+    'pizza_prices': ['pizza_id', 'pizza_type_id', 'size', 'price'],
+    'pizza_types': ['pizza_type_id', 'name', 'category', 'ingredients'],
+}
+
+SCHEMA = '''
+CREATE TABLE pizza_order_details (order_details_id INTEGER PRIMARY KEY, order_id INTEGER, pizza_id TEXT, quantity INTEGER);
+CREATE TABLE pizza_orders (order_id INTEGER PRIMARY KEY, date TEXT, time TEXT, month INTEGER, day_of_week TEXT, hour INTEGER);
+CREATE TABLE pizza_prices (pizza_id TEXT PRIMARY KEY, pizza_type_id TEXT, size TEXT, price REAL);
+CREATE TABLE pizza_types (pizza_type_id TEXT PRIMARY KEY, name TEXT, category TEXT, ingredients TEXT);
+CREATE INDEX order_details_order_id ON pizza_order_details (order_id);
+CREATE INDEX order_details_pizza_id ON pizza_order_details (pizza_id);
+CREATE INDEX orders_date ON pizza_orders (date);
+CREATE INDEX orders_hour ON pizza_orders (hour);
+CREATE INDEX orders_month_day ON pizza_orders (month, day_of_week);
+'''
+
+# Same joins as SQL/SQLQuery_2.sql
+JOINS = '''
+    FROM pizza_order_details ord_dets
+        LEFT JOIN pizza_orders ord ON ord_dets.order_id = ord.order_id
+        LEFT JOIN pizza_prices price ON ord_dets.pizza_id = price.pizza_id
+        LEFT JOIN pizza_types types ON price.pizza_type_id = types.pizza_type_id
+'''
+
+# Cube dimensions and measures (see cube.py) as SQL expressions
+DIMENSIONS = {
+    'month': 'ord.month',
+    'day_of_week': 'ord.day_of_week',
+    'hour': 'ord.hour',
+    'date': 'ord.date',
+    'pizza_flavor': 'price.pizza_type_id',
+    'size': 'price.size',
+    'category': 'types.category',
+}
+TABLE_ALIASES = {'ord_dets': 'pizza_order_details', 'ord': 'pizza_orders', 'price': 'pizza_prices', 'types': 'pizza_types'}
+MEASURES = {
+    'quantity': 'SUM(ord_dets.quantity)',
+    'price': 'SUM(price.price)',
+    'lines': 'COUNT(*)',
+    'orders': 'COUNT(DISTINCT ord_dets.order_id)',
+}
+
+BATCH_ROWS = 50_000
+
+
+# Streams a CSV into a table in batches, so loading never holds a whole file in memory
+def load_table(conn, name, path, derive=None):
+    source_columns = SOURCE_TABLES[name]
+    columns = source_columns + (['month', 'day_of_week', 'hour'] if derive else [])
+    insert = f'INSERT INTO {name} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+    with open(path, newline='') as f:
+        rows = ([row[column] for column in source_columns] for row in csv.DictReader(f))
+        if derive:
+            rows = (derive(row) for row in rows)
+        while True:
+            batch = [row for _, row in zip(range(BATCH_ROWS), rows)]
+            if not batch:
+                break
+            conn.executemany(insert, batch)
+
+
+# month, weekday and hour are stored on each order so they can be indexed
+def derive_order_columns(row):
+    date = datetime.date.fromisoformat(row[1])
+    return row + [date.month, day_order[date.weekday()], int(row[2][:2])]
+
+
+def build_database(data_path, target):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, scratch = tempfile.mkstemp(dir=target.parent, prefix='.build-', suffix='.sqlite')
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(scratch)
+        conn.executescript(SCHEMA)
+        for name in SOURCE_TABLES:
+            load_table(conn, name, data_path.joinpath(f'{name}.csv'), derive_order_columns if name == 'pizza_orders' else None)
+        conn.commit()
+        conn.execute('ANALYZE')
+        conn.close()
+        os.replace(scratch, target)
+    finally:
+        if os.path.exists(scratch):
+            os.unlink(scratch)
+
+
+# A fixed set of read-only connections shared by the request threads
+class ConnectionPool:
+    def __init__(self, path, size=4):
+        self.path, self.size = path, size
+        self.reopen()
+
+    # Opens a fresh set of connections. SQLite connections mustn't be used on both sides
+    # of a fork, so a forked process (e.g. a job, see jobs.py) calls this first and leaves
+    # the ones it inherited, and any lock on the queue, to its parent
+    def reopen(self):
+        self.connections = queue.Queue()
+        for _ in range(self.size):
+            self.connections.put(sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False))
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self.connections.get()
+        try:
+            yield conn
+        finally:
+            self.connections.put(conn)
+
+
+# Answers the same queries as SalesCube (cube.py) with SQL group-bys
+class SqlCube:
+    def __init__(self, data_path, pool_size=4):
+        sha = hashlib.sha256()
+        for name in SOURCE_TABLES:
+            sha.update(file_digest(data_path.joinpath(f'{name}.csv')).encode())
+        self.version = 'sql-' + sha.hexdigest()[:16]
+        path = CACHE_DIR.joinpath(f'{self.version}.sqlite')
+        if not path.exists():
+            build_database(data_path, path)
+            for old in CACHE_DIR.glob('sql-*.sqlite'):
+                if old != path:
+                    old.unlink(missing_ok=True)
+        self.pool = ConnectionPool(path, pool_size)
+
+    def query(self, measures, by=(), **filters):
+        single = isinstance(measures, str)
+        measures = [measures] if single else list(measures)
+        by = [by] if isinstance(by, str) else list(by)
+
+        where, params = [], []
+        for column, value in filters.items():
+            if isinstance(value, (list, tuple, set)):
+                value = list(value)
+                where.append(f'{DIMENSIONS[column]} IN ({", ".join("?" * len(value))})')
+                params.extend(value)
+            else:
+                where.append(f'{DIMENSIONS[column]} = ?')
+                params.append(value)
+
+        select = [f'{DIMENSIONS[column]} AS {column}' for column in by] + [f'{MEASURES[m]} AS {m}' for m in measures]
+        sql = f'SELECT {", ".join(select)} {JOINS}'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if by:
+            sql += f' GROUP BY {", ".join(DIMENSIONS[column] for column in by)} ORDER BY {", ".join(DIMENSIONS[column] for column in by)}'
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        result = pd.DataFrame(rows, columns=by + measures)
+        if not by:
+            result = result.iloc[0].fillna(0)
+        else:
+            result = result.set_index(by)
+        return result[measures[0]] if single else result
+
+    # Distinct values of one dimension, read from the table that holds it
+    def values(self, dimension):
+        alias = DIMENSIONS[dimension].split('.')[0]
+        sql = f'SELECT DISTINCT {DIMENSIONS[dimension]} FROM {TABLE_ALIASES[alias]} {alias} ORDER BY 1'
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql).fetchall()
+        return [row[0] for row in rows]
+
+    # (pizza_flavor, ingredient) pairs, for ingredients.IngredientMatrix
+    def ingredient_pairs(self):
+        with self.pool.connection() as conn:
+            rows = conn.execute('SELECT pizza_type_id, ingredients FROM pizza_types').fetchall()
+        return ingredient_pairs([row[0] for row in rows], [row[1] for row in rows])
+
+    # Order id, flavor and size of every order line, for baskets.BasketCounts
+    def order_lines(self):
+        sql = f'SELECT ord_dets.order_id, price.pizza_type_id, price.size {JOINS}'
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql).fetchall()
+        lines = pd.DataFrame(rows, columns=['order_id', 'pizza_flavor', 'size'])
+        return lines.astype({'pizza_flavor': 'category', 'size': 'category'})
+
+    # Quantity, sales, lines and orders from `start` (included) to `end` (excluded), in total
+    # or grouped by `by`; the same result as timeline.TimeIndex.aggregate_window. The date
+    # bounds let SQLite narrow the orders with the orders_date index first
+    def aggregate_window(self, start, end, by=()):
+        by = list(by)
+        moment = "ord.date || ' ' || ord.time"
+        where = f'ord.date BETWEEN ? AND ? AND {moment} >= ? AND {moment} < ?'
+        params = [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'), start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S')]
+        groups = [DIMENSIONS[column] for column in by] or ["'total'"]
+        select = [f'{group} AS {column}' for group, column in zip(groups, by or ['total'])]
+        select += [f'{MEASURES[m]} AS {name}' for m, name in [('quantity', 'quantity'), ('price', 'sales'), ('lines', 'lines'), ('orders', 'orders')]]
+        sql = f'SELECT {", ".join(select)} {JOINS} WHERE {where} GROUP BY {", ".join(groups)}'
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return pd.DataFrame(rows, columns=(by or ['total']) + ['quantity', 'sales', 'lines', 'orders']).set_index(by or ['total'])
@@ -0,0 +1,108 @@
+import numpy as np
+from flask import jsonify, request
+
+from partitions import ALL
+from prepare import day_order
+
+# Staffing what-ifs: hourly demand for every weekday x hour is a [7, 24] array, and a
+# batch of S staffing policies is evaluated against it at once as [S, 7, 24] arrays,
+# so sweeping thousands of policies is a handful of numpy operations.
+WEEKS_PER_YEAR = 52
+HOURS = np.arange(24)
+WEEKEND = np.isin(day_order, ['Saturday', 'Sunday'])
+
+# the staffing schedule proposed on the dashboard (hours missing are unstaffed)
+PROPOSED_WEEKDAY = {10: 0, 11: 4, 12: 6, 13: 6, 14: 6, 15: 3, 16: 3, 17: 4, 18: 3, 19: 2, 20: 2, 21: 1, 22: 1, 23: 0}
+PROPOSED_WEEKEND = {10: 0, 11: 3, 12: 3, 13: 4, 14: 4, 15: 3, 16: 3, 17: 4, 18: 4, 19: 3, 20: 3, 21: 2, 22: 1, 23: 0}
+
+# the notebook's thresholds, in pizzas sold in that hour of an average week: 1 employee
+# above 3.75 (195 a year), 2 above 10 (520), 3 above 15 (780), 4 above 20 (1040)
+NOTEBOOK_THRESHOLDS = [3.75, 10, 15, 20]
+
+
+# Average quantity sold per weekday x hour in a week, as a [7, 24] array. `weekdays` is
+# how many of each weekday the sales cover (partitions.Calendar), 52 of each by default
+def hourly_demand(cube, weekdays=None):
+    quantity = cube.query('quantity', by=['day_of_week', 'hour'])
+    demand = np.zeros((len(day_order), len(HOURS)))
+    for (day, hour), value in quantity.items():
+        demand[day_order.index(day), int(hour)] = value
+    weeks = np.full(len(day_order), WEEKS_PER_YEAR) if weekdays is None else np.asarray(weekdays, dtype=float)
+    return demand / np.maximum(weeks, 1)[:, None]
+
+
+# Dict of hour -> headcount for weekdays and for weekends, as a [7, 24] array
+def schedule(weekday, weekend):
+    staff = np.zeros((len(day_order), len(HOURS)), dtype=int)
+    for hours, rows in [(weekday, ~WEEKEND), (weekend, WEEKEND)]:
+        staff[np.ix_(rows, list(hours))] = list(hours.values())
+    return staff
+
+
+# Staffing before the proposed changes: 5 employees between 10am and 8pm and 3
+# otherwise, for every hour the store sells anything
+def current_staff(demand):
+    return np.where(demand > 0, np.where((HOURS > 10) & (HOURS < 20), 5, 3), 0)
+
+
+# Headcount for a batch of policies, [S, 7, 24]. Every argument broadcasts over the
+# S policies:
+#   thresholds  [S, K] weekly demand per weekday-hour; one employee per threshold
+#               exceeded (pad shorter rows with inf)
+#   capacity    [S] pizzas an employee handles in an hour, used instead of thresholds
+#   min_staff, max_staff  [S] bounds for every hour the store is open
+def required_staff(demand, thresholds=None, capacity=None, min_staff=0, max_staff=np.inf):
+    demand = np.asarray(demand, dtype=float)
+    if thresholds is not None:
+        thresholds = np.atleast_2d(np.asarray(thresholds, dtype=float))
+        staff = (demand[None, :, :, None] > thresholds[:, None, None, :]).sum(axis=-1)
+    elif capacity is not None:
+        capacity = np.atleast_1d(np.asarray(capacity, dtype=float))
+        staff = np.ceil(demand / capacity[:, None, None])
+    else:
+        raise ValueError('either thresholds or capacity is required')
+    min_staff = np.atleast_1d(np.asarray(min_staff, dtype=float))[:, None, None]
+    max_staff = np.atleast_1d(np.asarray(max_staff, dtype=float))[:, None, None]
+    staff = np.clip(staff, min_staff, max_staff)
+    return np.where(demand > 0, staff, 0)
+
+
+# Weekly staffed hours and labor cost deltas against `baseline` ([7, 24], the current
+# schedule by default) for every policy. Positive deltas are savings
+def evaluate(demand, wage, baseline=None, **policy):
+    staff = required_staff(demand, **policy)
+    if baseline is None:
+        baseline = current_staff(demand)
+    wage = np.broadcast_to(np.asarray(wage, dtype=float), staff.shape[:1])
+    weekly_hours = staff.sum(axis=(1, 2))
+    hours_saved = baseline.sum() - weekly_hours
+    return {
+        'staff': staff,
+        'weekly_hours': weekly_hours,
+        'weekly_cost_delta': hours_saved * wage,
+        'annual_cost_delta': hours_saved * wage * WEEKS_PER_YEAR,
+    }
+
+
+# POST /api/staffing takes a batch of policies as JSON, e.g.
+#   {"wage": 15, "thresholds": [[3.75, 10, 15, 20], [6, 12]], "max_staff": 4}
+# or {"wage": [15, 17], "capacity": [10, 12], "min_staff": 1, "store": "all", "year": 2015}
+# and returns the weekly hours and cost deltas of each, in order. Demand is taken from
+# the given store and year (partitions.SalesPartitions), all stores in the latest year by default
+def register_routes(server, sales):
+    @server.route('/api/staffing', methods=['POST'])
+    def staffing_scenarios():
+        body = request.get_json(force=True, silent=True) or {}
+        policy = {key: body[key] for key in ['capacity', 'min_staff', 'max_staff'] if key in body}
+        if 'thresholds' in body:
+            rows = body['thresholds']
+            rows = rows if rows and isinstance(rows[0], list) else [rows]
+            width = max(len(row) for row in rows)
+            policy['thresholds'] = [row + [np.inf] * (width - len(row)) for row in rows]
+        try:
+            selection = sales.select(body.get('store', ALL), body.get('year', sales.years[-1]))
+            demand = hourly_demand(selection.cube, selection.calendar.weekdays)
+            result = evaluate(demand, body.get('wage', 15), **policy)
+        except (KeyError, ValueError, TypeError) as error:
+            return jsonify({'error': str(error)}), 400
+        return jsonify({key: result[key].tolist() for key in ['weekly_hours', 'weekly_cost_delta', 'annual_cost_delta']})
@@ -0,0 +1,121 @@
+import concurrent.futures
+import os
+
+import numpy as np
+import pandas as pd
+
+from baskets import BasketCounts
+from cube import build_cube, combine_cells
+from ingredients import sales_ingredient_pairs
+from metrics import add_rows, measure
+from prepare import DATE_FORMAT, SALES_SCHEMA, TIME_FORMAT, order_ids, parse_categorical, prepare_sales, read_sales
+
+# STREAMING_BUILD=1 builds a partition's aggregates without ever holding its whole
+# SQL_output.csv: the CSV is read STREAM_CHUNK_ROWS lines at a time, each chunk gets the
+# same preparation as the whole file would (prepare.py), and is reduced to partial
+# aggregates that add up: its cube cells, flavor/ingredient pairs, first and last date
+# and basket counts. Peak memory is set by the chunk size (times STREAM_PROCESSES when
+# chunks are summarized in parallel), plus the size of the cube.
+#
+# Distinct orders only add up if no order is split between two chunks, so the lines of
+# the last order of each chunk are held back and start the next chunk. That needs each
+# order's lines next to each other in the file. SQL/SQLQuery_2.sql has no ORDER BY, so
+# it's checked: an order already given in an earlier chunk that shows up again stops
+# the build.
+STREAMING_BUILD = os.environ.get('STREAMING_BUILD') == '1'
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 250_000))
+STREAM_PROCESSES = int(os.environ.get('STREAM_PROCESSES', 1))
+
+
+# Raw chunks of the CSV that each hold whole orders
+def read_chunks(path, chunk_rows=STREAM_CHUNK_ROWS):
+    held = None
+    seen = np.empty(0, np.int64)  # sorted ids of the orders given so far
+
+    def checked(chunk):
+        nonlocal seen
+        orders = np.unique(order_ids(parse_categorical(chunk['date'], DATE_FORMAT), parse_categorical(chunk['time'], TIME_FORMAT)))
+        again = orders[np.isin(orders, seen, assume_unique=True)]
+        if len(again):
+            moment = pd.Timestamp(again[0], unit='s')
+            raise ValueError(f"{path}: the lines of the order of {moment} aren't next to each other, it would be "
+                             'counted twice. Sort the file by date and time, or build it without STREAMING_BUILD')
+        seen = np.union1d(seen, orders)
+        return chunk
+
+    for chunk in read_sales(path, chunksize=chunk_rows):
+        if held is not None:
+            # the two parts have their own categories
+            chunk = pd.concat([held, chunk], ignore_index=True).astype(SALES_SCHEMA)
+        date, time = chunk['date'].cat.codes.to_numpy(), chunk['time'].cat.codes.to_numpy()
+        other_orders = np.flatnonzero((date != date[-1]) | (time != time[-1]))
+        if len(other_orders) == 0:
+            held = chunk
+            continue
+        split = other_orders[-1] + 1
+        held = chunk.iloc[split:]
+        yield checked(chunk.iloc[:split])
+    if held is not None and len(held):
+        yield checked(held)
+
+
+class Summary:
+    def __init__(self, cells, ingredient_pairs, dates, baskets, rows):
+        self.cells = cells
+        self.ingredient_pairs = ingredient_pairs
+        self.dates = dates  # first and last date
+        self.baskets = baskets
+        self.rows = rows
+
+    @classmethod
+    def of_chunk(cls, raw):
+        df = prepare_sales(raw)
+        dates = df['date']
+        return cls(
+            build_cube(df),
+            sales_ingredient_pairs(df),
+            (dates.min(), dates.max()),
+            BasketCounts.from_lines(df['order_id'], df['pizza_flavor'], df['size']),
+            len(df),
+        )
+
+    def merge(self, other):
+        pairs = pd.concat([self.ingredient_pairs, other.ingredient_pairs], ignore_index=True).drop_duplicates()
+        return Summary(
+            combine_cells([self.cells, other.cells]),
+            pairs.astype('category').reset_index(drop=True),
+            (min(self.dates[0], other.dates[0]), max(self.dates[1], other.dates[1])),
+            BasketCounts.merge([self.baskets, other.baskets]),
+            self.rows + other.rows,
+        )
+
+
+# Summarizes every chunk and adds the summaries up as they come. With more than one
+# process, at most two chunks per process are read ahead
+def summarize(path, chunk_rows=STREAM_CHUNK_ROWS, processes=STREAM_PROCESSES):
+    total = None
+
+    def add(summary):
+        nonlocal total
+        add_rows(summary.rows)
+        total = summary if total is None else total.merge(summary)
+
+    with measure('stage', 'stream_partition'):
+        chunks = read_chunks(path, chunk_rows)
+        if processes <= 1:
+            for chunk in chunks:
+                add(Summary.of_chunk(chunk))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+                pending = set()
+                for chunk in chunks:
+                    pending.add(pool.submit(Summary.of_chunk, chunk))
+                    if len(pending) >= 2 * processes:
+                        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done:
+                            add(future.result())
+                for future in concurrent.futures.as_completed(pending):
+                    add(future.result())
+    if total is None:
+        raise ValueError(f'{path} has no sales')
+    return total
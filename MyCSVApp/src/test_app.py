@@ -0,0 +1,38 @@
+import importlib
+import sys
+
+import pytest
+import synthetic
+
+
+# The app with LAZY_TABS=1, loaded from a data folder of its own
+@pytest.fixture(scope='module')
+def lazy_app(tmp_path_factory):
+    data = synthetic.generate(5_000, tmp_path_factory.mktemp('lazy'), seed=3)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('SALES_DATA_DIR', str(data))
+        monkeypatch.setenv('LAZY_TABS', '1')
+        sys.modules.pop('app', None)
+        app = importlib.import_module('app')
+    yield app
+    sys.modules.pop('app', None)
+
+
+# nothing is prepared or built at startup, the first request for a tab with figures
+# loads its partition and builds its figures, and the next one reuses them
+def test_lazy_tabs_load_on_first_request(lazy_app):
+    app = lazy_app
+    partition = app.sales.partitions[0]
+    assert app.warm_thread is None
+    assert partition.version is not None
+    assert partition.df is None and partition.cube is None
+    assert not list(app.figure_cache.directory.glob('*.json'))
+
+    selection = (app.DEFAULT_STORE, app.DEFAULT_YEAR)
+    app.memoized_tab_content(app.figure_cache.version, 'tab-0', *selection)
+    assert partition.cube is None
+
+    content = app.memoized_tab_content(app.figure_cache.version, 'tab-3', *selection)
+    assert partition.cube is not None
+    assert list(app.figure_cache.directory.glob('*.json'))
+    assert app.memoized_tab_content(app.figure_cache.version, 'tab-3', *selection) is content
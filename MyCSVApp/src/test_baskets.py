@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baskets import BasketCounts
+
+
+@pytest.fixture(scope='module')
+def counts(sales):
+    return BasketCounts.from_lines(sales['order_id'], sales['pizza_flavor'], sales['size'])
+
+
+def assert_same(left, right):
+    assert left.orders == right.orders
+    pd.testing.assert_frame_equal(left.flavor_pairs, right.flavor_pairs, check_dtype=False)
+    pd.testing.assert_frame_equal(left.flavor_sizes, right.flavor_sizes, check_dtype=False)
+    pd.testing.assert_series_equal(left.sizes, right.sizes, check_dtype=False, check_names=False)
+
+
+def test_from_lines_matches_pairs_of_orders(sales, counts):
+    # dense order x flavor 0/1 table, then orders holding both flavors of each pair
+    holds = (pd.crosstab(sales['order_id'], sales['pizza_flavor'].astype(str)) > 0).astype(int)
+    assert counts.orders == len(holds)
+    expected = holds.T @ holds
+    pd.testing.assert_frame_equal(counts.flavor_pairs, expected.rename_axis(index=None, columns=None), check_dtype=False)
+    by_size = sales.groupby('size', observed=True)['order_id'].nunique()
+    assert counts.sizes.to_dict() == by_size.rename(index=str).to_dict()
+
+
+def test_merge_of_disjoint_orders(sales, counts):
+    first = (sales['order_id'] < sales['order_id'].median()).to_numpy()
+    # one half without the greek, so the merge has to line up different flavors and sizes
+    halves = [sales[first & (sales['pizza_flavor'] != 'the_greek').to_numpy()], sales[~first]]
+    merged = BasketCounts.merge(BasketCounts.from_lines(half['order_id'], half['pizza_flavor'], half['size']) for half in halves)
+    lines = pd.concat(halves)
+    expected = BasketCounts.from_lines(lines['order_id'], lines['pizza_flavor'], lines['size'])
+    assert_same(merged, expected)
+
+
+def test_frame_round_trip(counts):
+    frame = counts.to_frame()
+    assert list(frame.columns) == ['table', 'row', 'column', 'orders']
+    restored = BasketCounts.from_frame(frame)
+    assert_same(restored, counts)
+    np.testing.assert_allclose(restored.lift().to_numpy(), counts.lift().to_numpy())
@@ -0,0 +1,50 @@
+import importlib
+import sys
+
+import numpy as np
+import pytest
+import synthetic
+
+import cost_model
+
+REVENUE_PER_DAY = np.linspace(2000, 2600, 12)
+RAINFALL = np.array([3.5, 3.0, 4.3, 4.1, 3.9, 4.4, 4.6, 4.2, 4.0, 3.9, 3.6, 3.9])
+
+
+def test_simulate_summaries():
+    simulation = cost_model.simulate(REVENUE_PER_DAY, RAINFALL, years=2_000)
+    savings = simulation['savings']
+    assert savings.shape == (2_000,)
+    assert simulation['mean'] == pytest.approx(savings.mean())
+    assert simulation['percentiles'][5] <= simulation['percentiles'][50] <= simulation['percentiles'][95]
+    assert simulation['before'][50].shape == (12,)
+
+
+def test_simulate_without_rainfall():
+    rainfall = RAINFALL.copy()
+    rainfall[4] = np.nan
+    assert cost_model.simulate(REVENUE_PER_DAY, rainfall) is None
+    assert cost_model.simulate(REVENUE_PER_DAY, np.full(12, np.nan)) is None
+
+
+# The app, loaded from a data folder with no rainfall file at all
+@pytest.fixture(scope='module')
+def app_without_rainfall(tmp_path_factory):
+    data = synthetic.generate(5_000, tmp_path_factory.mktemp('no-rain'), seed=2)
+    data.joinpath('2015_RainFall.csv').unlink()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('SALES_DATA_DIR', str(data))
+        monkeypatch.setenv('LAZY_TABS', '1')
+        sys.modules.pop('app', None)
+        app = importlib.import_module('app')
+    yield app
+    sys.modules.pop('app', None)
+
+
+def test_weather_tab_without_rainfall(app_without_rainfall):
+    app = app_without_rainfall
+    text = app.cost_savings_range(app.DEFAULT_STORE, app.DEFAULT_YEAR)
+    assert text == app.NO_RAINFALL
+    assert '$nan' not in text
+    figure = app.update_cost_simulation_graph(app.DEFAULT_STORE, app.DEFAULT_YEAR)
+    assert figure['layout']['title']['text'] == app.NO_RAINFALL
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from cube import CUBE_DIMENSIONS, SalesCube, build_cube, combine_cells
+
+
+@pytest.fixture(scope='module')
+def cube(sales):
+    return SalesCube(build_cube(sales))
+
+
+@pytest.mark.parametrize('by', ['hour', ['day_of_week', 'hour'], ['pizza_flavor', 'month'], 'size'])
+def test_query_matches_groupby(sales, cube, by):
+    result = cube.query(['quantity', 'price', 'lines'], by=by)
+    grouped = sales.groupby(by, observed=True)
+    expected = pd.DataFrame({
+        'quantity': grouped['quantity'].sum(),
+        'price': grouped['price'].sum(),
+        'lines': grouped.size(),
+    })
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_query_filters(sales, cube):
+    result = cube.query('quantity', by='hour', day_of_week=['Friday', 'Saturday'], size='L')
+    lines = sales[sales['day_of_week'].isin(['Friday', 'Saturday']) & (sales['size'] == 'L')]
+    expected = lines.groupby('hour', observed=True)['quantity'].sum()
+    pd.testing.assert_series_equal(result, expected, check_dtype=False)
+    assert cube.query('price', month=3) == pytest.approx(sales.loc[sales['month'] == 3, 'price'].sum())
+
+
+def test_orders_are_distinct(sales, cube):
+    by = ['month', 'pizza_flavor', 'size', 'category']
+    result = cube.query('orders', by=by, day_of_week='Friday')
+    expected = sales[sales['day_of_week'] == 'Friday'].groupby(by, observed=True)['order_id'].nunique()
+    pd.testing.assert_series_equal(result, expected, check_dtype=False, check_names=False)
+
+
+@pytest.mark.parametrize('by', [(), 'hour', ['month', 'pizza_flavor']])
+def test_orders_across_flavors_rejected(cube, by):
+    # summing per-cell distinct orders would count an order once per pizza it holds
+    with pytest.raises(ValueError):
+        cube.query(['quantity', 'orders'], by=by)
+
+
+def test_add_and_combine(sales, cube):
+    # split by order, an order's lines arrive together
+    first = (sales['order_id'] < sales['order_id'].median()).to_numpy()
+    grown = SalesCube(build_cube(sales[first]))
+    grown.add(sales[~first])
+    combined = combine_cells([build_cube(sales[first]), build_cube(sales[~first])])
+    for cells in (grown.cells, combined):
+        pd.testing.assert_frame_equal(
+            cells.sort_values(CUBE_DIMENSIONS, ignore_index=True),
+            cube.cells.sort_values(CUBE_DIMENSIONS, ignore_index=True),
+            check_dtype=False, check_categorical=False,
+        )
@@ -0,0 +1,61 @@
+import pathlib
+import runpy
+import types
+
+import plotly.graph_objects as go
+
+from figure_cache import FigureCache, code_version
+
+
+def bar(n):
+    return go.Figure(go.Bar(y=list(range(n))))
+
+
+def test_set_version_keeps_other_processes_figures(tmp_path):
+    mine, other = FigureCache('a', tmp_path), FigureCache('b', tmp_path)
+    mine_bar, other_bar = mine.cached(bar), other.cached(bar)
+    assert mine_bar(3) == other_bar(3)
+    b = other.directory
+    mine.set_version('c')
+    assert sorted(tmp_path.iterdir()) == [b]
+    # a version nobody has built for yet leaves nothing behind
+    other.set_version('d')
+    other.set_version('e')
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_prune_removes_earlier_versions(tmp_path):
+    stale = [tmp_path.joinpath('figures-olddata-0123abcd'), tmp_path.joinpath('figures-v1-00000000')]
+    for directory in stale:
+        directory.mkdir()
+        directory.joinpath('bar-0.json').write_text('{}')
+    cache = FigureCache('v1', tmp_path)
+    cache.cached(bar)(2)
+    cache.prune()
+    assert list(tmp_path.iterdir()) == [cache.directory]
+
+
+def test_code_version_covers_every_module(tmp_path):
+    tmp_path.joinpath('app.py').write_text('x = 1\n')
+    tmp_path.joinpath('cube.py').write_text('y = 1\n')
+    before = code_version(tmp_path)
+    tmp_path.joinpath('cube.py').write_text('y = 2\n')
+    assert code_version(tmp_path) != before
+
+
+# gunicorn's master clears the figures a previous run left in the cache
+def test_startup_prunes_stale_figures(sales_dir, monkeypatch):
+    from data_cache import CACHE_DIR
+    from partitions import SalesPartitions
+    from payloads import COMPACT_RESPONSES, pack_figure
+
+    stale = CACHE_DIR.joinpath('figures-previousrun-deadbeef-pack_figure')
+    stale.mkdir(parents=True)
+    monkeypatch.setenv('SALES_DATA_DIR', str(sales_dir))
+    monkeypatch.setenv('LAZY_TABS', '1')
+    hooks = runpy.run_path(str(pathlib.Path(__file__).parent.parent.joinpath('gunicorn.conf.py')))
+    server = types.SimpleNamespace(app=types.SimpleNamespace(app_uri='app:server'), log=types.SimpleNamespace(info=print))
+    hooks['on_starting'](server)
+    assert not stale.exists()
+    current = FigureCache(SalesPartitions.discover(sales_dir, lazy=True).version, encode=pack_figure if COMPACT_RESPONSES else None)
+    assert not any(path.name.startswith('figures-') and path != current.directory for path in CACHE_DIR.iterdir())
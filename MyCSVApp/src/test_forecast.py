@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecast import DemandForecast, features
+from partitions import Calendar
+from prepare import day_order
+
+FLAVORS = ['bbq_ckn', 'hawaiian']
+HOURS = [12, 18]
+RAINFALL = np.array([3.5, 3.0, 4.3, 4.1, 3.9, 4.4, 4.6, 4.2, 4.0, 3.9, 3.6, 3.9])
+
+
+# The queries DemandForecast makes, answered from quantities per day that follow
+# features() exactly: intercept, sine, cosine and rainfall of the month
+class LinearCube:
+    def __init__(self, calendar, coefficients, rainfall):
+        rows = []
+        for month in range(1, 13):
+            x = features([month], [rainfall[month - 1]] if rainfall is not None else None)[0]
+            for series, (flavor, day, hour) in enumerate((f, d, h) for f in FLAVORS for d in day_order for h in HOURS):
+                per_day = x @ coefficients[:len(x), series]
+                rows.append((month, flavor, day, hour, per_day * calendar.weekdays_per_month.loc[month, day]))
+        self.lines = pd.DataFrame(rows, columns=['month', 'pizza_flavor', 'day_of_week', 'hour', 'quantity'])
+        self.lines['price'] = self.lines['quantity'] * np.where(self.lines['pizza_flavor'] == 'bbq_ckn', 20, 10)
+
+    def query(self, measures, by):
+        return self.lines.groupby(by)[measures].sum()
+
+
+@pytest.fixture
+def calendar():
+    return Calendar([('2015-01-01', '2015-12-31')])
+
+
+# The columns of the hours LinearCube sells in, out of every flavor x weekday x hour series
+def sold_hours(coefficients):
+    return coefficients.reshape(len(coefficients), len(FLAVORS), len(day_order), 24)[..., HOURS].reshape(len(coefficients), -1)
+
+
+def known_coefficients(n):
+    rng = np.random.default_rng(0)
+    series = len(FLAVORS) * len(day_order) * len(HOURS)
+    return np.vstack([rng.uniform(20, 30, series), rng.uniform(-3, 3, (n - 1, series))])
+
+
+def test_fit_recovers_a_linear_series(calendar):
+    coefficients = known_coefficients(4)
+    rain = pd.DataFrame({'rainfall': RAINFALL}, index=pd.Index(range(1, 13), name='month'))
+    forecast = DemandForecast(LinearCube(calendar, coefficients, RAINFALL), calendar, rain, ridge=0)
+    assert forecast.use_rain
+    np.testing.assert_allclose(sold_hours(forecast.coefficients), coefficients, atol=1e-8)
+    assert abs(forecast.coefficients).sum() == pytest.approx(abs(coefficients).sum())
+
+    expected = features([7], [5.0]) @ coefficients
+    np.testing.assert_allclose(sold_hours(forecast.predict(7, rainfall=5.0)[None]), expected, atol=1e-8)
+    assert forecast.next_week_month == 1
+    np.testing.assert_allclose(forecast.next_week(), forecast.predict(1))
+    np.testing.assert_allclose(forecast.revenue_per_pizza, [20, 10])
+
+
+def test_fit_without_rainfall(calendar):
+    coefficients = known_coefficients(3)
+    rain = pd.DataFrame({'rainfall': np.nan}, index=pd.Index(range(1, 13), name='month'))
+    forecast = DemandForecast(LinearCube(calendar, coefficients, None), calendar, rain, ridge=0)
+    assert not forecast.use_rain
+    np.testing.assert_allclose(sold_hours(forecast.coefficients), coefficients, atol=1e-8)
+    assert forecast.predict(3).shape == (len(FLAVORS), len(day_order), 24)
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from cube import SalesCube, build_cube
+from ingredients import IngredientMatrix, ingredient_pairs, sales_ingredient_pairs
+
+
+@pytest.fixture(scope='module')
+def matrix(sales):
+    return IngredientMatrix(sales_ingredient_pairs(sales))
+
+
+# pizzas per ingredient the way a dummy column per ingredient would count them
+def exploded(sales, by, **filters):
+    lines = sales[['quantity', by, 'ingredients'] + list(filters)].copy()
+    for column, value in filters.items():
+        lines = lines[lines[column].isin(value if isinstance(value, list) else [value])]
+    lines['ingredient'] = lines['ingredients'].astype(str).str.split(',')
+    lines = lines.explode('ingredient')
+    lines['ingredient'] = lines['ingredient'].str.strip()
+    return lines.groupby([by, 'ingredient'], observed=True)['quantity'].sum().unstack(fill_value=0)
+
+
+@pytest.mark.parametrize('by, filters', [
+    ('hour', {}),
+    ('month', {'day_of_week': 'Friday'}),
+    ('size', {'month': [6, 7, 8]}),
+])
+def test_rollup_matches_explode(sales, matrix, by, filters):
+    demand = matrix.rollup(SalesCube(build_cube(sales)), by, **filters)
+    expected = exploded(sales, by, **filters)
+    demand.index = demand.index.astype(str)
+    expected.index = expected.index.astype(str)
+    expected = expected.reindex(index=demand.index, columns=demand.columns, fill_value=0)
+    pd.testing.assert_frame_equal(demand, expected, check_dtype=False, check_names=False)
+
+
+def test_pairs_strip_spaces_and_duplicates():
+    pairs = ingredient_pairs(['a', 'a', 'b'], ['Garlic,  Tomatoes', 'Garlic, Tomatoes', 'Garlic,'])
+    assert sorted(map(tuple, pairs.astype(str).to_numpy())) == [('a', 'Garlic'), ('a', 'Tomatoes'), ('b', 'Garlic')]
@@ -0,0 +1,66 @@
+import os
+import time
+
+import pytest
+
+from jobs import JOB_RESULT_SECONDS, LocalJobManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = LocalJobManager(lambda: 'v1', processes=1, directory=tmp_path.joinpath('jobs'))
+    yield manager
+    if manager.pool is not None:
+        manager.pool.shutdown()
+
+
+def wait_for_result(manager, key):
+    deadline = time.time() + 30
+    while not manager.result_ready(key):
+        assert time.time() < deadline, 'the job never finished'
+        time.sleep(0.05)
+    return manager.get_result(key, key)
+
+
+# identical requests share one job, and a finished one is answered from its result
+def test_identical_requests_share_a_job(manager, tmp_path):
+    calls = tmp_path.joinpath('calls')
+
+    def double(x):
+        with open(calls, 'a') as f:
+            f.write('.')
+        time.sleep(0.5)
+        return x * 2
+
+    manager.make_job_fn(double, False, key='double')
+    assert manager.call_job_fn('k1', 'double', [2], {}) == 'k1'
+    assert manager.job_running('k1')
+    manager.call_job_fn('k1', 'double', [2], {})
+    assert wait_for_result(manager, 'k1') == 4
+    manager.call_job_fn('k1', 'double', [2], {})
+    assert calls.read_text() == '.'
+
+
+def test_errors_are_returned_as_results(manager):
+    def fail():
+        raise RuntimeError('no data')
+
+    manager.make_job_fn(fail, False, key='fail')
+    manager.call_job_fn('k2', 'fail', [], {})
+    assert wait_for_result(manager, 'k2')['long_callback_error']['msg'] == 'no data'
+
+
+def test_old_results_expire(manager):
+    manager.write('old', 'result', 1)
+    manager.write('new', 'result', 2)
+    past = time.time() - JOB_RESULT_SECONDS - 10
+    os.utime(manager.path('old', 'result'), (past, past))
+    manager.expire()
+    assert not manager.result_ready('old')
+    assert manager.get_result('new', 'new') == 2
+
+
+# a job whose worker died isn't running, the next request starts it again
+def test_job_of_a_dead_worker_is_not_running(manager):
+    manager.path('k3', 'job').write_text('999999999')
+    assert not manager.job_running('k3')
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baskets import BasketCounts
+from cube import SalesCube, build_cube
+import live as live_module
+from live import LiveSales
+from partitions import Partition
+
+
+@pytest.fixture
+def halves(sales):
+    ids = sales['order_id'].to_numpy()
+    return sales[ids < np.median(ids)], sales[ids >= np.median(ids)]
+
+
+# A loaded partition of `df`
+def partition_of(df):
+    partition = Partition('main', 2015, None)
+    partition.df, partition.cube, partition.version = df, SalesCube(build_cube(df)), 'v0'
+    return partition
+
+
+# The order lines back as read_sales gives them
+def raw_lines(df):
+    raw = df.drop(columns=['month', 'day', 'day_of_week', 'hour', 'order_id', 'multiple_orders'])
+    raw = raw.rename(columns={'pizza_flavor': 'pizza_type_id'})
+    raw['date'] = raw['date'].dt.strftime('%Y-%m-%d').astype('category')
+    return raw
+
+
+def test_flag_multiple_orders(halves, tmp_path):
+    base, rest = halves
+    live = LiveSales(partition_of(base), 'v0', tmp_path)
+    new = rest.copy()
+    live.flag_multiple_orders(new)
+    np.testing.assert_array_equal(new['multiple_orders'], rest['order_id'].duplicated().astype(np.int8))
+    assert live.new_orders.tolist() == sorted(set(rest['order_id']))
+    # orders seen in an earlier batch, or in the base frame
+    for again in (rest.iloc[:100].copy(), base.iloc[:100].copy()):
+        live.flag_multiple_orders(again)
+        assert (again['multiple_orders'] == 1).all()
+
+
+def test_ingest_grows_cube_and_baskets(sales, halves, tmp_path):
+    base, rest = halves
+    partition = partition_of(base)
+    partition.baskets()
+    cube = partition.cube
+    live = LiveSales(partition, 'v0', tmp_path, on_update=lambda version: versions.append(version))
+    versions = []
+    live.ingest('a.csv', raw_lines(rest))
+    assert cube.query('lines') == len(sales)
+    assert cube.query('quantity') == sales['quantity'].sum()
+    assert versions == [live.version]
+    assert live.changes_since('v0')['months'] == sorted(rest['month'].unique().tolist())
+
+    baskets = partition.baskets()
+    expected = BasketCounts.from_lines(sales['order_id'], sales['pizza_flavor'], sales['size'])
+    assert baskets.orders == expected.orders
+    pd.testing.assert_frame_equal(baskets.flavor_pairs, expected.flavor_pairs, check_dtype=False)
+    pd.testing.assert_frame_equal(baskets.flavor_sizes, expected.flavor_sizes, check_dtype=False)
+
+    # /api/sales windows see the new lines too
+    december = partition.time_index().aggregate_window(pd.Timestamp('2015-12-01'), pd.Timestamp('2016-01-01'))
+    in_december = sales[sales['month'] == 12]
+    assert december['lines'].iloc[0] == len(in_december)
+    assert december['quantity'].iloc[0] == in_december['quantity'].sum()
+
+
+@pytest.fixture
+def orders_client(halves, tmp_path):
+    from flask import Flask
+    base, rest = halves
+    live = LiveSales(partition_of(base), 'v0', tmp_path)
+    server = Flask(__name__)
+    live.register_routes(server)
+    return server.test_client(), live
+
+
+def csv_body(sales_dir, lines=20):
+    return ''.join(sales_dir.joinpath('SQL_output.csv').read_text().splitlines(keepends=True)[:lines + 1]).encode()
+
+
+def test_post_orders_from_same_host(orders_client, sales_dir):
+    client, live = orders_client
+    response = client.post('/api/orders', data=csv_body(sales_dir))
+    assert response.status_code == 202
+    assert response.json['rows'] == 20
+    assert live.files == [response.json['file']]
+    # another host, without a token
+    assert client.post('/api/orders', data=csv_body(sales_dir), environ_base={'REMOTE_ADDR': '203.0.113.5'}).status_code == 403
+
+
+def test_post_orders_token_and_size(orders_client, sales_dir, monkeypatch):
+    client, live = orders_client
+    monkeypatch.setattr(live_module, 'LIVE_ORDERS_TOKEN', 'secret')
+    remote = {'REMOTE_ADDR': '203.0.113.5'}
+    assert client.post('/api/orders', data=csv_body(sales_dir), environ_base=remote).status_code == 403
+    headers = {'Authorization': 'Bearer secret'}
+    assert client.post('/api/orders', data=csv_body(sales_dir), headers=headers, environ_base=remote).status_code == 202
+    monkeypatch.setattr(live_module, 'LIVE_ORDERS_MAX_BYTES', 100)
+    assert client.post('/api/orders', data=csv_body(sales_dir), headers=headers, environ_base=remote).status_code == 413
+
+
+def test_post_orders_of_another_year(orders_client, sales_dir):
+    client, live = orders_client
+    body = csv_body(sales_dir).decode().replace(',2015-', ',2016-').encode()
+    response = client.post('/api/orders', data=body)
+    assert response.status_code == 400
+    assert '2016' in response.json['error']
+    assert live.files == []
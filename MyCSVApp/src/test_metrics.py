@@ -0,0 +1,60 @@
+import re
+
+import pytest
+from flask import Flask
+
+import metrics
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(metrics, 'registry', metrics.Registry())
+    server = Flask(__name__)
+
+    @server.route('/api/sales')
+    def sales():
+        return 'ok'
+
+    @server.route('/assets/<path:path>')
+    def asset(path):
+        return path
+
+    @server.route('/_dash-update-component', methods=['POST'])
+    def update():
+        return '{}'
+
+    metrics.register_routes(server, {'content.children': 'render_content'})
+    return server.test_client()
+
+
+def names():
+    return {name for quantity, kind, name in metrics.registry.histograms if kind == 'request'}
+
+
+def test_requests_are_named_by_route(client):
+    client.get('/api/sales?start=2015-01-01')
+    client.get('/assets/a.css')
+    client.get('/assets/b.js')
+    for path in ['/nope', '/x"y', '/%0Aname']:
+        assert client.get(path).status_code == 404
+    client.post('/_dash-update-component', json={'output': 'content.children'})
+    client.post('/_dash-update-component', json={'output': 'made-up.children'})
+    client.post('/_dash-update-component', json={'output': ['not', 'a', 'string']})
+    assert names() == {'/api/sales', '/assets/<path:path>', 'other', 'render_content', 'callback'}
+
+
+def test_render_escapes_label_values(client):
+    metrics.registry.observe('seconds', 'stage', 'a "quoted"\nname\\', 0.2)
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'name="a \\"quoted\\"\\nname\\\\"' in text
+    # every sample is one line: name{labels} value
+    for line in text.splitlines():
+        assert line.startswith('#') or re.fullmatch(r'[a-z_]+\{.*\} \S+', line), line
+
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram([1, 10])
+    for value in [0.5, 1, 5, 50]:
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert (histogram.count, histogram.sum) == (4, 56.5)
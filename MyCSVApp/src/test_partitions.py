@@ -0,0 +1,17 @@
+import pytest
+import synthetic
+
+from partitions import discover_partitions
+
+
+def test_single_file_year(sales_dir):
+    [partition] = discover_partitions(sales_dir)
+    assert (partition.store, partition.year) == ('main', 2015)
+    assert partition.rain_path.name == '2015_RainFall.csv'
+
+
+def test_single_file_of_several_years_rejected(tmp_path):
+    # labelled by its first line, the 2016 sales would be missing from every year lookup
+    synthetic.generate(2_000, tmp_path, start='2015-07-01')
+    with pytest.raises(ValueError, match='from 2015 to 2016'):
+        discover_partitions(tmp_path)
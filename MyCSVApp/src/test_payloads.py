@@ -0,0 +1,98 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+from flask import Flask, jsonify
+
+import payloads
+from payloads import pack_figure, typed_array, unpack
+
+
+@pytest.mark.parametrize('values', [
+    list(np.linspace(0, 1, 20)),
+    list(range(-5, 15)),
+    list(range(0, 200_000, 10_000)),
+    [[1.5] * 10, [2.5] * 10],
+    [2**40 + i for i in range(10)],
+])
+def test_typed_array_round_trip(values):
+    spec = typed_array(values)
+    np.testing.assert_array_equal(unpack(spec), np.asarray(values))
+
+
+def test_typed_array_dtypes():
+    assert typed_array(list(range(10)))['dtype'] == 'u1'
+    assert typed_array(list(range(-10, 0)))['dtype'] == 'i1'
+    assert typed_array([0.5] * 10)['dtype'] == 'f8'
+    assert typed_array([[1] * 10] * 3)['shape'] == '3,10'
+
+
+@pytest.mark.parametrize('values', [
+    [1, 2, 3],  # too short to pay off
+    ['a'] * 10,
+    [1, None] * 5,
+    [True] * 10,
+    [[1, 2], [3]] * 5,
+    [2**60] * 10,  # no 64 bit integers in plotly.js
+])
+def test_values_left_as_they_are(values):
+    assert typed_array(values) is None
+
+
+def test_pack_figure():
+    figure = {
+        'data': [{'type': 'bar', 'x': ['a'] * 10, 'y': list(range(100, 110)), 'marker': {'color': list(range(1000, 1030)), 'size': list(range(10))}}],
+        'layout': {'title': {'text': 'Sales'}, 'template': {'data': {'bar': [{}], 'pie': [{}]}, 'layout': {}}},
+    }
+    packed = pack_figure(figure)
+    trace = packed['data'][0]
+    assert trace['x'] == ['a'] * 10
+    np.testing.assert_array_equal(unpack(trace['y']), range(100, 110))
+    np.testing.assert_array_equal(unpack(trace['marker']['color']), range(1000, 1030))
+    # packed it would be longer
+    assert trace['marker']['size'] == list(range(10))
+    assert list(packed['layout']['template']['data']) == ['bar']
+    assert packed['layout']['title'] == {'text': 'Sales'}
+    assert len(json.dumps(packed)) < len(json.dumps(figure))
+
+
+@pytest.fixture
+def client():
+    server = Flask(__name__)
+
+    @server.route('/big')
+    def big():
+        return jsonify(list(range(2_000)))
+
+    @server.route('/small')
+    def small():
+        return jsonify([1])
+
+    @server.route('/post', methods=['POST'])
+    def post():
+        return jsonify(list(range(2_000)))
+
+    payloads.register_routes(server)
+    return server.test_client()
+
+
+def test_gzip(client):
+    plain = client.get('/big')
+    assert 'Content-Encoding' not in plain.headers
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain.data
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    assert client.post('/post', headers={'Accept-Encoding': 'gzip'}).headers['Content-Encoding'] == 'gzip'
+
+
+def test_unchanged_get_is_a_304(client):
+    etag = client.get('/big').headers['ETag']
+    assert etag.startswith('W/')
+    response = client.get('/big', headers={'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert client.get('/big', headers={'If-None-Match': 'W/"other"'}).status_code == 200
+    assert 'ETag' not in client.post('/post').headers
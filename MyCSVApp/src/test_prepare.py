@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from prepare import day_order, order_ids, prepare_sales, read_sales
+
+
+def test_schema(sales):
+    for column in ['pizza_id', 'size', 'category', 'pizza_flavor', 'ingredients']:
+        assert sales[column].dtype == 'category'
+    for column in ['month', 'day', 'hour']:
+        assert sales[column].dtype == np.int8
+    assert sales['quantity'].dtype == np.int16
+    assert sales['date'].dtype == 'datetime64[ns]'
+    assert sales['day_of_week'].cat.ordered
+    assert list(sales['day_of_week'].cat.categories) == day_order
+
+
+# the same values as parsing every date and time on its own
+def test_dates_and_order_ids(sales, sales_dir):
+    raw = pd.read_csv(sales_dir.joinpath('SQL_output.csv'), usecols=['date', 'time'])
+    moments = pd.to_datetime(raw['date'] + ' ' + raw['time'])
+    np.testing.assert_array_equal(sales['date'], moments.dt.normalize())
+    np.testing.assert_array_equal(sales['month'], moments.dt.month)
+    np.testing.assert_array_equal(sales['hour'], moments.dt.hour)
+    np.testing.assert_array_equal(sales['day_of_week'].astype(str), moments.dt.day_name())
+    np.testing.assert_array_equal(sales['order_id'], moments.to_numpy('datetime64[s]').astype(np.int64))
+    assert sales['multiple_orders'].sum() == len(sales) - sales['order_id'].nunique()
+
+
+def test_order_ids_of_one_moment():
+    dates, times = pd.to_datetime(['1970-01-02', '1970-01-02']), pd.to_datetime(['00:00:01', '23:59:59'], format='%H:%M:%S')
+    assert list(order_ids(dates, times)) == [86401, 2 * 86400 - 1]
+
+
+def test_missing_dates_are_refused(sales_dir):
+    raw = read_sales(sales_dir.joinpath('SQL_output.csv'), nrows=10)
+    raw.loc[3, 'date'] = np.nan
+    with pytest.raises(ValueError, match="'date' has missing values"):
+        prepare_sales(raw)
@@ -0,0 +1,74 @@
+import importlib
+import json
+import sys
+
+import pytest
+import synthetic
+from dash import dcc, html
+
+import snapshot
+
+
+# A snapshot of the app on a data folder of its own
+@pytest.fixture(scope='module')
+def built(tmp_path_factory):
+    data = synthetic.generate(5_000, tmp_path_factory.mktemp('snapshot-data'), seed=4)
+    directory = tmp_path_factory.mktemp('snapshot')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('SALES_DATA_DIR', str(data))
+        monkeypatch.setenv('LAZY_TABS', '1')
+        sys.modules.pop('app', None)
+        app = importlib.import_module('app')
+        selections = snapshot.build(directory)
+    yield app, directory, selections
+    sys.modules.pop('app', None)
+
+
+def test_build_writes_every_tab_and_slider_state(built):
+    app, directory, selections = built
+    assert selections == [(app.DEFAULT_STORE, app.DEFAULT_YEAR)]
+    manifest = json.loads(directory.joinpath('manifest.json').read_text())
+    assert manifest['version'] == app.DATASET_VERSION
+    assert manifest['default'] == [app.DEFAULT_STORE, app.DEFAULT_YEAR]
+    tabs = [tab['value'] for tab in manifest['tabs']]
+    assert tabs == [tab.value for tab in snapshot.find(app.app.layout, 'tabs').children]
+
+    target = directory.joinpath(app.DEFAULT_STORE, str(app.DEFAULT_YEAR))
+    for tab in tabs:
+        assert json.loads(target.joinpath(f'{tab}.json').read_text())
+    sliders = json.loads(target.joinpath('sliders.json').read_text())
+    assert {graph: slider['slider'] for graph, slider in sliders.items()} == {
+        'heatmap-graph': 'day-slider', 'employee-area-chart': 'day-slider', 'scatterplot': 'month-slider'}
+    assert len(sliders['heatmap-graph']['store']['states']) == 7
+    assert len(sliders['scatterplot']['store']['states']) == 12
+
+    page = target.joinpath('index.html').read_text()
+    figures = json.loads(page.split('<script type="application/json" id="figures">')[1].split('</script>')[0])
+    for graph in figures:
+        assert f'<div class="graph" id="{graph}"' in page
+    assert directory.joinpath('assets').is_dir()
+
+
+def test_server_serves_only_the_snapshot(built, monkeypatch):
+    app, directory, selections = built
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_DIR', directory)
+    client = snapshot.server.test_client()
+    assert b'Open the report' in client.get('/').data
+    assert b'id="figures"' in client.get(f'/{app.DEFAULT_STORE}/{app.DEFAULT_YEAR}/').data
+    assert client.get('/manifest.json').json['version'] == app.DATASET_VERSION
+    assert client.get('/missing.json').status_code == 404
+    assert client.get('/../conftest.py').status_code == 404
+
+
+def test_render():
+    figures = {}
+    text = snapshot.render(html.Div([
+        html.P('<b> & co', style={'fontSize': 25, 'fontWeight': 700}),
+        dcc.Graph(id='pie', figure={'data': []}),
+        dcc.Slider(id='month', min=1, max=2, value=2, marks={1: 'Jan', 2: 'Feb'}),
+    ]), figures)
+    assert '<p style="font-size: 25px; font-weight: 700">&lt;b&gt; &amp; co</p>' in text
+    assert '<div class="graph" id="pie"></div>' in text
+    assert 'value="1"' in text and 'data-labels=' in text
+    assert figures == {'pie': {'data': []}}
+    assert '<\\/script>' in snapshot.script_json('</script>')
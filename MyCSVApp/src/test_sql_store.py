@@ -0,0 +1,78 @@
+import concurrent.futures
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+from cube import SalesCube, build_cube
+from sql_store import SqlCube
+
+
+@pytest.fixture(scope='module')
+def cubes(sales, sales_dir):
+    return SalesCube(build_cube(sales)), SqlCube(sales_dir)
+
+
+# Both results with plain string/int keys, in the same order
+def normalized(result, by):
+    result = result.reset_index()
+    for column in result.columns:
+        if result[column].dtype.name in ('category', 'object'):
+            result[column] = result[column].astype(str)
+    return result.sort_values(by, ignore_index=True)
+
+
+@pytest.mark.parametrize('by, filters', [
+    (['hour'], {}),
+    (['day_of_week', 'hour'], {'size': 'L'}),
+    (['month', 'pizza_flavor'], {'day_of_week': ['Friday', 'Saturday']}),
+    (['size', 'category'], {'month': 7}),
+])
+def test_query_matches_sales_cube(cubes, by, filters):
+    sales_cube, sql_cube = cubes
+    measures = ['quantity', 'price', 'lines']
+    pd.testing.assert_frame_equal(
+        normalized(sql_cube.query(measures, by=by, **filters), by),
+        normalized(sales_cube.query(measures, by=by, **filters), by),
+        check_dtype=False,
+    )
+
+
+def test_totals_and_orders(cubes):
+    sales_cube, sql_cube = cubes
+    for measure in ['quantity', 'price', 'lines']:
+        assert sql_cube.query(measure) == pytest.approx(sales_cube.query(measure))
+    by = ['pizza_flavor', 'size', 'category']
+    pd.testing.assert_frame_equal(
+        normalized(sql_cube.query('orders', by=by), by),
+        normalized(sales_cube.query('orders', by=by), by),
+        check_dtype=False,
+    )
+
+
+def test_values(cubes):
+    sales_cube, sql_cube = cubes
+    for dimension in ['month', 'hour', 'pizza_flavor', 'size', 'category']:
+        assert [str(value) for value in sql_cube.values(dimension)] == [str(value) for value in sales_cube.values(dimension)]
+
+
+# the cube the forked process below inherits
+forked_cube = None
+
+
+def reopen_connections():
+    forked_cube.pool.reopen()
+
+
+def total_quantity():
+    return forked_cube.query('quantity')
+
+
+# what a job process does (see app.py): opens its own connections, then queries
+def test_forked_process_reopens_connections(cubes):
+    global forked_cube
+    sales_cube, forked_cube = cubes
+    fork = multiprocessing.get_context('fork')
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=fork, initializer=reopen_connections) as pool:
+        assert pool.submit(total_quantity).result() == pytest.approx(sales_cube.query('quantity'))
+    assert forked_cube.query('quantity') == pytest.approx(sales_cube.query('quantity'))
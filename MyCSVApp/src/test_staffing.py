@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from cube import SalesCube, build_cube
+from prepare import day_order
+from staffing import NOTEBOOK_THRESHOLDS, WEEKS_PER_YEAR, current_staff, evaluate, hourly_demand, required_staff
+
+
+@pytest.fixture(scope='module')
+def demand(sales):
+    return hourly_demand(SalesCube(build_cube(sales)))
+
+
+# the notebook's nested thresholds, on the pizzas sold in each weekday-hour of the year
+def notebook_staff(quantity):
+    return 4 if quantity > 1040 else 3 if quantity > 780 else 2 if quantity > 520 else 1 if quantity > 195 else 0
+
+
+def test_notebook_thresholds(sales, demand):
+    quantity = sales.groupby(['day_of_week', 'hour'], observed=True)['quantity'].sum()
+    expected = np.zeros((len(day_order), 24), dtype=int)
+    for (day, hour), value in quantity.items():
+        expected[day_order.index(day), hour] = notebook_staff(value)
+    np.testing.assert_array_equal(required_staff(demand, NOTEBOOK_THRESHOLDS)[0], expected)
+
+
+def test_each_threshold_level():
+    annual = np.array([0, 100, 195, 196, 520, 521, 780, 781, 1040, 1041, 5000])
+    demand = np.zeros((7, 24))
+    demand[0, :len(annual)] = annual / WEEKS_PER_YEAR
+    staff = required_staff(demand, NOTEBOOK_THRESHOLDS)[0, 0, :len(annual)]
+    assert list(staff) == [notebook_staff(value) for value in annual]
+    assert list(staff) == [0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4]
+
+
+def test_policy_batch(demand):
+    staff = required_staff(demand, capacity=[1, 2, 1000], min_staff=[0, 0, 2], max_staff=[3, np.inf, np.inf])
+    assert staff.shape == (3, 7, 24)
+    assert staff[0].max() <= 3
+    np.testing.assert_array_equal(staff[1], np.where(demand > 0, np.ceil(demand / 2), 0))
+    np.testing.assert_array_equal(staff[2], np.where(demand > 0, 2, 0))
+    with pytest.raises(ValueError):
+        required_staff(demand)
+
+
+def test_evaluate_against_current_staff(demand):
+    result = evaluate(demand, [15, 20], thresholds=[NOTEBOOK_THRESHOLDS, [np.inf] * 4])
+    baseline = current_staff(demand).sum()
+    assert result['weekly_hours'][1] == 0
+    assert result['weekly_hours'][0] == required_staff(demand, NOTEBOOK_THRESHOLDS).sum()
+    np.testing.assert_allclose(result['weekly_cost_delta'], (baseline - result['weekly_hours']) * [15, 20])
+    np.testing.assert_allclose(result['annual_cost_delta'], result['weekly_cost_delta'] * WEEKS_PER_YEAR)
@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from baskets import BasketCounts
+from cube import CUBE_DIMENSIONS, build_cube
+from ingredients import sales_ingredient_pairs
+from prepare import read_sales
+from streaming import read_chunks, summarize
+
+
+# chunks shorter than an order (up to 4 lines) too
+@pytest.mark.parametrize('lines, chunk_rows', [(300, 3), (300, 4), (20_000, 997), (20_000, 1_000_000)])
+def test_read_chunks_keeps_orders_whole(sales_dir, tmp_path, lines, chunk_rows):
+    path = tmp_path.joinpath('SQL_output.csv')
+    whole = read_sales(sales_dir.joinpath('SQL_output.csv'), nrows=lines)
+    whole.to_csv(path, index=False)
+    chunks = list(read_chunks(path, chunk_rows))
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True).astype(str), whole.astype(str))
+    # the held back lines of an order start the next chunk, so no order is in two chunks
+    keys = [set(chunk['date'].astype(str) + ' ' + chunk['time'].astype(str)) for chunk in chunks]
+    assert sum(len(k) for k in keys) == len(set().union(*keys))
+
+
+def sorted_cells(cells):
+    return cells.astype({dimension: str for dimension in CUBE_DIMENSIONS}).sort_values(CUBE_DIMENSIONS, ignore_index=True)
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_summarize_matches_full_build(sales, sales_dir, processes):
+    summary = summarize(sales_dir.joinpath('SQL_output.csv'), chunk_rows=3_000, processes=processes)
+    assert summary.rows == len(sales)
+    pd.testing.assert_frame_equal(sorted_cells(summary.cells), sorted_cells(build_cube(sales)), check_dtype=False)
+    assert summary.dates == (sales['date'].min(), sales['date'].max())
+    pairs = sales_ingredient_pairs(sales).astype(str)
+    assert set(map(tuple, summary.ingredient_pairs.astype(str).to_numpy())) == set(map(tuple, pairs.to_numpy()))
+    expected = BasketCounts.from_lines(sales['order_id'], sales['pizza_flavor'], sales['size'])
+    assert summary.baskets.orders == expected.orders
+    pd.testing.assert_frame_equal(summary.baskets.flavor_pairs, expected.flavor_pairs, check_dtype=False)
+
+
+# an order whose lines are apart could be split between chunks and counted twice
+def test_unsorted_file_is_refused(sales_dir, tmp_path):
+    path = tmp_path.joinpath('SQL_output.csv')
+    read_sales(sales_dir.joinpath('SQL_output.csv')).sample(frac=1, random_state=0).to_csv(path, index=False)
+    with pytest.raises(ValueError, match='counted twice'):
+        summarize(path, chunk_rows=3_000)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from timeline import TimeIndex, build_timeline
+
+
+@pytest.fixture(scope='module')
+def index(sales):
+    return TimeIndex(build_timeline(sales))
+
+
+def moments(sales):
+    return pd.to_datetime(sales['order_id'], unit='s')
+
+
+@pytest.mark.parametrize('start, end', [
+    ('2015-03-01', '2015-03-08T12:00'),
+    ('2015-07-04T11:30', '2015-07-04T13:00'),
+    ('2015-01-01', '2016-01-01'),
+    ('2016-02-01', '2016-03-01'),
+])
+def test_window_matches_mask(sales, index, start, end):
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    at = moments(sales)
+    expected = sales[(at >= start) & (at < end)]
+    window = index.window(start, end)
+    assert len(window) == len(expected)
+    assert window['timestamp'].is_monotonic_increasing
+    assert window['quantity'].sum() == expected['quantity'].sum()
+    assert window['price'].sum() == pytest.approx(expected['price'].sum())
+
+
+def test_aggregate_window_by_hour(sales, index):
+    start, end = pd.Timestamp('2015-05-01'), pd.Timestamp('2015-06-01')
+    at = moments(sales)
+    lines = sales[(at >= start) & (at < end)]
+    result = index.aggregate_window(start, end, by=['hour'])
+    grouped = lines.groupby('hour')
+    np.testing.assert_array_equal(result['quantity'], grouped['quantity'].sum())
+    np.testing.assert_array_equal(result['orders'], grouped['order_id'].nunique())
+
+
+def test_add_keeps_timeline_sorted(sales):
+    first = (sales['order_id'] < sales['order_id'].median()).to_numpy()
+    # the later half first, then the earlier one merged into it
+    index = TimeIndex(build_timeline(sales[~first]))
+    index.add(sales[first])
+    full = build_timeline(sales)
+    assert index.timeline['timestamp'].is_monotonic_increasing
+    np.testing.assert_array_equal(index.timeline['timestamp'], full['timestamp'])
+    assert index.timeline['quantity'].sum() == full['quantity'].sum()
+    assert index.aggregate_window(pd.Timestamp('2015-01-01'), pd.Timestamp('2016-01-01'))['orders'].iloc[0] == sales['order_id'].nunique()
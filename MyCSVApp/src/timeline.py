@@ -0,0 +1,114 @@
+import io
+
+import numpy as np
+import pandas as pd
+from flask import Response, jsonify, request
+
+from metrics import add_rows
+
+# Order lines sorted by time, so any date/time window is the contiguous slice between two
+# binary searches instead of a boolean scan of every line. Aggregates for the window are
+# then grouped along any of GROUP_BY.
+TIMELINE_COLUMNS = ['timestamp', 'order_id', 'pizza_flavor', 'size', 'category', 'month', 'day_of_week', 'hour', 'quantity', 'price']
+GROUP_BY = ['pizza_flavor', 'size', 'category', 'month', 'day_of_week', 'hour', 'date']
+
+
+# The timeline of a prepared sales frame, whose order_id is already the order's seconds
+# since 1970 (see prepare.py)
+def build_timeline(lines):
+    lines = lines.assign(timestamp=lines['order_id'])[TIMELINE_COLUMNS]
+    # quantity is int16 in the frame, too narrow for the sum over a long window
+    lines = lines.astype({'quantity': 'int64'})
+    order = np.argsort(lines['timestamp'].to_numpy(), kind='stable')
+    return lines.take(order).reset_index(drop=True)
+
+
+def seconds(timestamp):
+    return int(pd.Timestamp(timestamp).value // 10**9)
+
+
+class TimeIndex:
+    def __init__(self, timeline):
+        self.timeline = timeline
+
+    # Lines from `start` (included) to `end` (excluded), as a slice of the timeline
+    def window(self, start, end):
+        timeline = self.timeline
+        lo, hi = np.searchsorted(timeline['timestamp'].to_numpy(), [seconds(start), seconds(end)])
+        add_rows(hi - lo)
+        return timeline.iloc[lo:hi]
+
+    # Merges new prepared order lines (see live.py) into the sorted timeline: each goes in
+    # after the lines with the same or an earlier time. The merged timeline replaces the
+    # old one in one assignment, so windows read meanwhile see one or the other
+    def add(self, lines):
+        added = build_timeline(lines)
+        timeline = self.timeline
+        positions = np.searchsorted(timeline['timestamp'].to_numpy(), added['timestamp'].to_numpy(), side='right')
+        order = np.insert(np.arange(len(timeline)), positions, np.arange(len(timeline), len(timeline) + len(added)))
+        merged = pd.concat([timeline, added], ignore_index=True)
+        for column in merged:
+            # concat falls back to object when the two have different categories
+            if merged[column].dtype == object:
+                merged[column] = merged[column].astype('category')
+        self.timeline = merged.take(order).reset_index(drop=True)
+
+    # quantity, sales (sum of line prices), lines and distinct orders in the window, in
+    # total or grouped by `by`
+    def aggregate_window(self, start, end, by=()):
+        window = self.window(start, end)
+        if 'date' in by:
+            window = window.assign(date=(window['timestamp'].to_numpy() // 86400).astype('datetime64[D]').astype(str))
+        if not by:
+            window = window.assign(total='total')
+            by = ['total']
+        return window.groupby(list(by), observed=True).agg(
+            quantity=('quantity', 'sum'),
+            sales=('price', 'sum'),
+            lines=('order_id', 'size'),
+            orders=('order_id', 'nunique'),
+        )
+
+
+# Aggregates of several partitions' windows (TimeIndex or sql_store.SqlCube), added up per group (their orders are distinct)
+def aggregate(indexes, start, end, by=()):
+    results = [index.aggregate_window(start, end, by) for index in indexes]
+    result = pd.concat(results)
+    return result.groupby(level=list(range(result.index.nlevels)), observed=True).sum()
+
+
+# GET /api/sales?start=2015-03-01&end=2015-03-08T12:00&by=pizza_flavor,hour&store=all
+# returns the quantity, sales, lines and orders in [start, end) per group, as columnar
+# JSON, or with format=npz as a compressed NumPy .npz archive with one array per column
+def register_routes(server, sales):
+    @server.route('/api/sales')
+    def sales_window():
+        args = request.args
+        try:
+            if 'start' not in args or 'end' not in args:
+                raise ValueError('start and end are required')
+            start, end = pd.Timestamp(args['start']), pd.Timestamp(args['end'])
+            by = [column for column in args.get('by', '').split(',') if column]
+            if set(by) - set(GROUP_BY):
+                raise ValueError(f'by must be among {", ".join(GROUP_BY)}')
+            partitions = sales.window_partitions(args.get('store', 'all'), start, end)
+            result = aggregate([partition.time_index() for partition in partitions], start, end, by).reset_index()
+        except (KeyError, ValueError) as error:
+            return jsonify({'error': str(error)}), 400
+        if 'total' in result:
+            result = result.drop(columns='total')
+        result = result.astype({column: str for column in by if column in ['pizza_flavor', 'size', 'category', 'day_of_week']})
+
+        if args.get('format') == 'npz':
+            buffer = io.BytesIO()
+            # text columns as fixed width strings, so the archive loads without pickle
+            np.savez_compressed(buffer, **{column: result[column].to_numpy(dtype=str if result[column].dtype == object else None) for column in result})
+            return Response(buffer.getvalue(), mimetype='application/octet-stream',
+                            headers={'Content-Disposition': 'attachment; filename=sales.npz'})
+        return jsonify({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'by': by,
+            'columns': result.columns.tolist(),
+            'data': {column: result[column].tolist() for column in result},
+        })